@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+"""
+scripts/ 下 Python 流水线的基准测试（全部离线运行，不调用任何 API）
+用法: python3 scripts/bench.py <基准名> [选项]
+
+基准:
+  encode   OCR 请求体编码：整份 base64 + json.dumps 对比 mmap 流式编码（峰值 RSS）
+  thesis   论文清洗流水线（thesis_clean.py）：合成 form-feed 论文，整读入内存 / 流式 / mmap 页索引
+  pages    form-feed 页索引（page_index.py）：整读 split 对比 mmap 偏移索引 / sidecar，定位起止页与随机读页
+  docx     docx 段落读取：python-docx 对象模型对比 docx_text.py 流式 iterparse
+  match    目录→正文模糊匹配（toc_match.py）：normalize() 调用次数与耗时，逐段比对对比预计算索引
+  scale    整条流水线的规模曲线：按现有书稿 1×/10×/100× 合成论文、目录+正文 docx、多章节 source.md，
+           分别跑 thesis_clean / docx_book / extract_missing_essays，按阶段报告吞吐和峰值 RSS 增量
+           （阶段划分同 --profile，见 profiling.py）
+  hedge    对冲请求（ocr_hedge.py）：两个本地桩服务器（ocr_stub.py），主服务商有长尾；
+           对比不对冲 / 对冲的总耗时，核对页序与每家的在途请求上限，不符时退出码为 1
+  retry    重试与限速（ocr_client.py）：本地桩服务器按比例返回 429/500/503，核对每页都成功、
+           页序正确、每个服务端错误都被客户端重试了一次，不符时退出码为 1
+
+示例:
+  python3 scripts/bench.py encode --size-mb 300
+  python3 scripts/bench.py thesis --pages 500,5000
+  python3 scripts/bench.py pages --pages 50000
+  python3 scripts/bench.py docx --scale 1,10
+  python3 scripts/bench.py match --poems 100
+  python3 scripts/bench.py scale --scale 1,10,100 --json .cache/bench-scale.json
+  python3 scripts/bench.py hedge --pages 40 --workers 4
+  python3 scripts/bench.py retry --pages 11 --fail-rate 0.3
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import resource
+import contextlib
+import subprocess
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def peak_rss_mb() -> float:
+    """当前进程峰值 RSS（MB）；Linux 单位为 KB，macOS 为字节"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_isolated(argv: list[str]) -> dict:
+    """在独立子进程中运行一个变体，保证各自的峰值 RSS 互不干扰"""
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), *argv],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def print_table(rows: list[dict], columns: list[str]) -> None:
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+# ---------------------------------------------------------------- encode
+
+def _encode_payload(data_uri: str) -> dict:
+    return {
+        "model": "bench",
+        "messages": [{"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": data_uri}},
+            {"type": "text", "text": "请识别"},
+        ]}],
+        "max_tokens": 8192,
+    }
+
+
+def _encode_variant(variant: str, path: str) -> dict:
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+    if variant == "legacy":
+        # 与旧版 encode_file() + requests.post(json=...) 相同的内存路径
+        with open(path, "rb") as f:
+            b64 = base64.b64encode(f.read()).decode("utf-8")
+        body = json.dumps(_encode_payload(f"data:application/pdf;base64,{b64}"), ensure_ascii=False).encode("utf-8")
+        size = len(body)
+        digest.update(body)
+    else:
+        from ocr_payload import DataURIJSONBody
+        body = DataURIJSONBody(path, "application/pdf", _encode_payload)
+        size = len(body)
+        # 模拟 urllib3 按 16 KB 分块 read() 发送
+        for chunk in iter(lambda: body.read(16384), b""):
+            digest.update(chunk)
+    return {
+        "variant": variant,
+        "seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "body_mb": round(size / 1024 / 1024, 1),
+        "sha256": digest.hexdigest()[:12],
+    }
+
+
+def bench_encode(args) -> None:
+    if args.variant:
+        print(json.dumps(_encode_variant(args.variant, args.file)))
+        return
+    with tempfile.TemporaryDirectory(prefix="bench-encode-") as tmp:
+        path = os.path.join(tmp, "scan.pdf")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        print(f"输入文件: {args.size_mb} MB（随机字节）", file=sys.stderr)
+        rows = [run_isolated(["encode", "--variant", v, "--file", path]) for v in ("legacy", "stream")]
+    print_table(rows, ["variant", "seconds", "peak_rss_mb", "body_mb", "sha256"])
+    if rows[0]["sha256"] != rows[1]["sha256"]:
+        print("错误: 两种编码的请求体不一致", file=sys.stderr)
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------- thesis
+
+SYNTH_START = "合成论文正文起始句"
+SYNTH_SENTENCE = "新边塞诗以昌耀、周涛、杨牧、章德益为代表，在八十年代的诗坛上形成了独特的风景线"
+
+
+def write_synth_thesis(path: str, pages: int, seed: int = 1) -> None:
+    """生成与 full_text.txt 同版式的合成论文：正文页带脚注块和页码，末尾是注释页"""
+    rng = random.Random(seed)
+    numerals = "一二三四五六七八九十"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("摘\n\n要\n\n合成摘要。\n\nI\n\f")
+        for n in range(1, pages + 1):
+            lines = [SYNTH_START + "。"] if n == 1 else []
+            if n % 40 == 1:
+                lines.append(f"{numerals[(n // 40) % 10]} 第{n}页开始的章")
+            elif n % 10 == 1:
+                lines.append(f"（{numerals[(n // 10) % 10]}）小节标题")
+            for _ in range(28):
+                start = rng.randrange(len(SYNTH_SENTENCE))
+                text = (SYNTH_SENTENCE[start:] + SYNTH_SENTENCE)[:rng.choice([36, 36, 36, 24])]
+                lines.append(text + rng.choice(["", "", "", "。", "：", "[12]"]))
+            if n % 3 == 0:
+                lines[-3] = lines[-3].rstrip("。：") + "c"
+                lines += ["", "c 脚注：" + SYNTH_SENTENCE, "续行" + SYNTH_SENTENCE[:10]]
+            lines += ["", str(n), ""]
+            f.write("\n".join(lines) + "\f")
+        f.write("注释\n\n")
+        for n in range(1, pages // 2 + 1):
+            f.write(f"[{n}] 作者：《{SYNTH_SENTENCE[:8]}》，\n出版社，1986 年版，第 {n} 页。\n")
+        f.write("\n参考文献\n\n[1] 略\n")
+
+
+def _thesis_variant(variant: str, path: str) -> dict:
+    from page_index import PageIndex
+    from thesis_clean import MarkdownWriter, iter_pages, write_thesis
+    start = time.perf_counter()
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as out:
+        with open(path, encoding="utf-8") as f:
+            if variant == "inmemory":
+                # 旧写法的内存形态：整读入、整切页、输出先在内存里拼好
+                pages = f.read().split("\f")
+                buf = io.StringIO()
+                stats = write_thesis(MarkdownWriter(buf), pages, SYNTH_START)
+                out.write(buf.getvalue())
+            elif variant == "stream":
+                stats = write_thesis(MarkdownWriter(out), iter_pages(f), SYNTH_START)
+            else:
+                with PageIndex(path) as pages:
+                    stats = write_thesis(MarkdownWriter(out), pages, SYNTH_START)
+        out_mb = out.tell() / 1024 / 1024
+    seconds = time.perf_counter() - start
+    in_mb = os.path.getsize(path) / 1024 / 1024
+    return {
+        "variant": variant,
+        "input_mb": round(in_mb, 1),
+        "seconds": round(seconds, 2),
+        "mb_per_s": round(in_mb / seconds, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "output_mb": round(out_mb, 1),
+        "paragraphs": stats.paragraphs,
+        "footnotes": stats.footnotes,
+    }
+
+
+def bench_thesis(args) -> None:
+    if args.variant:
+        print(json.dumps(_thesis_variant(args.variant, args.file)))
+        return
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-thesis-") as tmp:
+        for pages in [int(p) for p in args.pages.split(",")]:
+            path = os.path.join(tmp, f"thesis-{pages}.txt")
+            write_synth_thesis(path, pages)
+            for variant in ("inmemory", "stream", "mmap"):
+                row = run_isolated(["thesis", "--variant", variant, "--file", path])
+                rows.append({"pages": pages, **row})
+    print_table(rows, ["pages", "variant", "input_mb", "seconds", "mb_per_s", "peak_rss_mb",
+                       "output_mb", "paragraphs", "footnotes"])
+
+
+# ---------------------------------------------------------------- pages
+
+def _pages_variant(variant: str, path: str) -> dict:
+    """打开论文、定位正文起止页，再随机读 100 页"""
+    from page_index import PageIndex
+    from thesis_clean import is_end_page
+    rng = random.Random(1)
+    t0 = time.perf_counter()
+    if variant == "split":
+        with open(path, encoding="utf-8") as f:
+            pages = f.read().split("\f")
+        t1 = time.perf_counter()
+        first = next(i for i, p in enumerate(pages) if SYNTH_START in p)
+        end = next(i for i in range(first, len(pages)) if is_end_page(pages[i]))
+        t2 = time.perf_counter()
+        for _ in range(100):
+            pages[rng.randrange(len(pages))]
+        count = len(pages)
+    else:
+        sidecar = path + ".pages" if variant == "sidecar" else None
+        with PageIndex(path, sidecar=sidecar) as pages:
+            t1 = time.perf_counter()
+            first = pages.find(SYNTH_START)
+            end = pages.find_heading("注释", first)
+            t2 = time.perf_counter()
+            for _ in range(100):
+                pages.page(rng.randrange(len(pages)))
+            count = len(pages)
+    t3 = time.perf_counter()
+    return {
+        "variant": variant,
+        "open_ms": round((t1 - t0) * 1000, 1),
+        "locate_ms": round((t2 - t1) * 1000, 1),
+        "random100_ms": round((t3 - t2) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "pages": count,
+        "body": f"{first}-{end}",
+    }
+
+
+def bench_pages(args) -> None:
+    if args.variant:
+        print(json.dumps(_pages_variant(args.variant, args.file)))
+        return
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-pages-") as tmp:
+        path = os.path.join(tmp, "thesis.txt")
+        write_synth_thesis(path, args.pages)
+        print(f"输入文件: {args.pages} 页, {os.path.getsize(path) / 1024 / 1024:.1f} MB", file=sys.stderr)
+        # sidecar 跑两次：第一次建索引并写入，第二次直接读取
+        for variant in ("split", "mmap", "sidecar", "sidecar"):
+            rows.append(run_isolated(["pages", "--variant", variant, "--file", path]))
+    rows[-1]["variant"] = "sidecar (warm)"
+    print_table(rows, ["variant", "open_ms", "locate_ms", "random100_ms", "peak_rss_mb", "pages", "body"])
+
+
+# ---------------------------------------------------------------- docx
+
+DOCX_PARAGRAPHS = 2789  # 《为了爱情，巴格达不嫌远》docx 的段落数
+
+
+def write_synth_docx(path: str, paragraphs: int, seed: int = 1) -> None:
+    """生成合成诗集 docx：短诗行为主，夹杂目录式的制表符行和软换行"""
+    import docx
+    rng = random.Random(seed)
+    doc = docx.Document()
+    for n in range(paragraphs):
+        kind = n % 20
+        if kind == 0:
+            doc.add_paragraph("")
+        elif kind == 1:
+            doc.add_paragraph(SYNTH_SENTENCE[:rng.randint(6, 16)] + "／" + SYNTH_SENTENCE[:8] + f"\t{n}")
+        elif kind == 2:
+            doc.add_paragraph(SYNTH_SENTENCE[:12] + "\n" + SYNTH_SENTENCE[12:24])
+        else:
+            doc.add_paragraph(SYNTH_SENTENCE[rng.randrange(10):][:rng.randint(4, 22)])
+    doc.save(path)
+
+
+def _docx_variant(variant: str, path: str) -> dict:
+    start = time.perf_counter()
+    if variant == "python-docx":
+        import docx
+        texts = [p.text for p in docx.Document(path).paragraphs]
+    else:
+        from docx_text import read_paragraph_texts
+        texts = read_paragraph_texts(path)
+    seconds = time.perf_counter() - start
+    return {
+        "variant": variant,
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "paragraphs": len(texts),
+        "sha256": hashlib.sha256("\x00".join(texts).encode("utf-8")).hexdigest()[:12],
+    }
+
+
+def bench_docx(args) -> None:
+    if args.write:
+        write_synth_docx(args.file, args.write)
+        return
+    if args.variant:
+        print(json.dumps(_docx_variant(args.variant, args.file)))
+        return
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-docx-") as tmp:
+        for scale in [int(s) for s in args.scale.split(",")]:
+            path = os.path.join(tmp, f"book-{scale}x.docx")
+            # 在子进程里生成：Linux 下 ru_maxrss 会随 fork/exec 继承，父进程不能先涨内存
+            subprocess.run([sys.executable, os.path.abspath(__file__), "docx", "--write",
+                            str(DOCX_PARAGRAPHS * scale), "--file", path], check=True)
+            for variant in ("python-docx", "stream"):
+                row = run_isolated(["docx", "--variant", variant, "--file", path])
+                rows.append({"scale": f"{scale}x", "docx_kb": os.path.getsize(path) // 1024, **row})
+    print_table(rows, ["scale", "docx_kb", "variant", "seconds", "peak_rss_mb", "paragraphs", "sha256"])
+    for a, b in zip(rows[::2], rows[1::2]):
+        if a["sha256"] != b["sha256"]:
+            print(f"错误: {a['scale']} 两种读取的段落文本不一致", file=sys.stderr)
+            sys.exit(1)
+
+
+# ---------------------------------------------------------------- match
+
+POEM_CHARS = "黑戈壁暴风雪远山晶莹雪冠我匆匆变成绿树衔着赤诚爱悄悄飞进她梦境忧伤抚慰破碎心沉默呼唤名字等待春风夜莺篝火相思熬煎飘落辽远目光蒙细雨溅湿"
+
+
+def synth_poems(poems: int, seed: int = 1) -> tuple[list[str], list[str]]:
+    """合成诗集段落：返回 (段落文本, 目录标题)，每首诗约 20 段，以日期行结尾"""
+    rng = random.Random(seed)
+    paras, titles = [], []
+    for n in range(poems):
+        title = "".join(rng.choice(POEM_CHARS) for _ in range(rng.randint(6, 14)))
+        titles.append(title + "／" + "".join(rng.choice(POEM_CHARS) for _ in range(8)))
+        paras.append(title.replace("的", "") if n % 5 == 0 else title)
+        for _ in range(rng.randint(12, 24)):
+            paras.append("".join(rng.choice(POEM_CHARS) for _ in range(rng.randint(0, 18))))
+        paras.append(f"{1980 + n % 10}年{n % 12 + 1}月")
+    return paras, titles
+
+
+def _legacy_first_match(paras: list[str], title: str, start: int, end: int):
+    """旧 find_poem_starts 的内层循环：逐段 match_score，收集全部候选后取第一个"""
+    import toc_match
+    candidates = [i for i in range(start, end) if toc_match.match_score(title, paras[i].strip()) >= 0.8]
+    return candidates[0] if candidates else None
+
+
+def bench_match(args) -> None:
+    import toc_match
+    paras, titles = synth_poems(args.poems)
+    calls = {"n": 0}
+    original = toc_match.normalize
+
+    def counting(t):
+        calls["n"] += 1
+        return original(t)
+
+    toc_match.normalize = counting
+    rows = []
+    try:
+        for variant in ("legacy", "indexed"):
+            calls["n"] = 0
+            start = time.perf_counter()
+            if variant == "indexed":
+                store = toc_match.ParagraphStore(paras)
+                find = lambda t, a, b: store.first_match(t, a, b)
+            else:
+                find = lambda t, a, b: _legacy_first_match(paras, t, a, b)
+            starts, prev = [], 0
+            for title in titles:
+                pos = find(toc_match.first_line(title), prev, len(paras))
+                starts.append(pos)
+                if pos:
+                    prev = pos + 1
+            rows.append({
+                "variant": variant,
+                "paragraphs": len(paras),
+                "toc": len(titles),
+                "normalize_calls": calls["n"],
+                "ms": round((time.perf_counter() - start) * 1000, 1),
+                "found": sum(p is not None for p in starts),
+                "starts": starts,
+            })
+    finally:
+        toc_match.normalize = original
+    print_table(rows, ["variant", "paragraphs", "toc", "normalize_calls", "ms", "found"])
+    if rows[0]["starts"] != rows[1]["starts"]:
+        print("错误: 两种匹配结果不一致", file=sys.stderr)
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------- scale
+
+# 1× 对应仓库里现有书稿的规模
+THESIS_PAGES = 74    # books/essay4_zhangqiuge/full_text.txt 的页数
+BOOK_POEMS = 99      # 《为了爱情，巴格达不嫌远》的诗数
+BOOK_VOLUMES = 2
+CORPORA = ("thesis", "docx", "essays")
+_NUMERALS = "一二三四五六七八九十"
+_DOCX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="word/document.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+}
+
+
+def _docx_paragraph(text: str) -> str:
+    from xml.sax.saxutils import escape
+    runs = []
+    for k, line in enumerate(text.split("\n")):
+        if k:
+            runs.append("<w:br/>")
+        for j, part in enumerate(line.split("\t")):
+            if j:
+                runs.append("<w:tab/>")
+            if part:
+                runs.append(f'<w:t xml:space="preserve">{escape(part)}</w:t>')
+    return f"<w:p><w:r>{''.join(runs)}</w:r></w:p>" if runs else "<w:p/>"
+
+
+def write_synth_book_docx(path: str, poems: int, volumes: int = BOOK_VOLUMES, seed: int = 1) -> None:
+    """生成目录 + 正文结构的合成诗集 docx（版式同 docx_book.py 能自动识别的书稿）
+
+    直接写 word/document.xml，100× 规模也只需数秒，不依赖 python-docx。
+    """
+    paras, titles = synth_poems(poems, seed)
+    # synth_poems 的每首诗从标题段开始、到日期行结束，按诗切开再分卷
+    bounds = [0] + [i + 1 for i, p in enumerate(paras) if p[:1].isdigit()]
+    per_volume = -(-poems // volumes)
+    out = ["张合成", SYNTH_SENTENCE * 6, "", "目录"]
+    for v in range(volumes):
+        out.append(f"卷之{_NUMERALS[v]}")
+        for n in range(v * per_volume, min(poems, (v + 1) * per_volume)):
+            out.append(f"{titles[n]}\t{n * 3 + 1}")
+    for v in range(volumes):
+        out.append(f"卷之{_NUMERALS[v]}")
+        first, last = v * per_volume, min(poems, (v + 1) * per_volume)
+        out.extend(paras[bounds[first]:bounds[last]])
+    out += ["后记", SYNTH_SENTENCE * 4, SYNTH_SENTENCE * 3]
+    import zipfile
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, xml in _DOCX_PARTS.items():
+            z.writestr(name, xml)
+        with z.open("word/document.xml", "w") as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>')
+            for text in out:
+                f.write(_docx_paragraph(text).encode("utf-8"))
+            f.write(b"</w:body></w:document>")
+
+
+def write_synth_source(path: str, poems: int, seed: int = 1) -> None:
+    """生成多章节的合成 source.md：序跋类章节（长度随规模增长）夹在各卷诗歌之间"""
+    from toc_match import first_line
+    paras, titles = synth_poems(poems, seed)
+    scale = max(1, poems // BOOK_POEMS)
+    essay = lambda n: "\n\n".join(SYNTH_SENTENCE + "。" for _ in range(n * scale))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# 合成诗集\n\n## 作者小传\n\n{essay(2)}\n\n## 内容简介\n\n{essay(3)}\n\n## 目录\n\n")
+        f.write("\n".join(f"　　{t}" for t in titles) + "\n\n---\n\n")
+        f.write(f"## 序\n\n{essay(30)}\n\n## 代序\n\n{essay(10)}\n\n")
+        body = iter(paras)
+        for v, chunk in enumerate(range(0, poems, 50)):
+            f.write(f"## 第{v + 1}辑（{min(50, poems - chunk)}首）\n\n")
+            for title in titles[chunk:chunk + 50]:
+                f.write(f"### {first_line(title)}\n\n")
+                for line in body:
+                    f.write(line + "\n")
+                    if line[:1].isdigit():
+                        break
+                f.write("\n")
+            f.write("* * *\n\n")
+        f.write(f"## 后记\n\n{essay(20)}\n\n## 出版信息\n\n书名：合成诗集\n")
+
+
+def scale_corpus_path(corpus: str, root: str) -> str:
+    """语料在 root 下的输入路径（essays 按仓库的 books/ + src/content/essays/ 布局）"""
+    return {
+        "thesis": os.path.join(root, "full_text.txt"),
+        "docx": os.path.join(root, "book", "synth.docx"),
+        "essays": os.path.join(root, "books", "synth", "source.md"),
+    }[corpus]
+
+
+def write_scale_corpus(corpus: str, scale: int, root: str) -> None:
+    path = scale_corpus_path(corpus, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if corpus == "thesis":
+        write_synth_thesis(path, THESIS_PAGES * scale)
+    elif corpus == "docx":
+        write_synth_book_docx(path, BOOK_POEMS * scale)
+    else:
+        os.makedirs(os.path.join(root, "src", "content", "essays"), exist_ok=True)
+        write_synth_source(path, BOOK_POEMS * scale)
+
+
+def _run_scale_corpus(corpus: str, path: str) -> dict:
+    """在当前（全新的）进程里跑一条流水线，按阶段返回耗时与峰值 RSS 增量"""
+    from profiling import profiler
+    profiler.enable(os.devnull, memory=True)
+    root = os.path.dirname(path)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null), contextlib.redirect_stderr(null):
+        if corpus == "thesis":
+            from page_index import PageIndex
+            from thesis_clean import MarkdownWriter, write_thesis
+            with PageIndex(path) as pages, open(os.path.join(root, "thesis.md"), "w", encoding="utf-8") as out:
+                stats = write_thesis(MarkdownWriter(out), pages, SYNTH_START)
+            result = f"{stats.paragraphs} 段 / {stats.footnotes} 脚注"
+        elif corpus == "docx":
+            import docx_book
+            result = docx_book.import_book(root, os.path.join(root, "source.md"))
+            result = result.split(": ", 1)[1]
+        else:
+            import extract_missing_essays as essays
+            os.chdir(os.path.dirname(os.path.dirname(root)))
+            manifest = {"version": essays.MANIFEST_VERSION, "books": {}, "outputs": {}}
+            essays.update_book("synth", manifest)
+            result = f"{len(manifest['books']['synth']['outputs'])} 篇"
+    seconds = time.perf_counter() - start
+    in_mb = os.path.getsize(path) / 1024 / 1024
+    return {
+        "corpus": corpus,
+        "input_mb": round(in_mb, 2),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(in_mb / seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "result": result,
+        "stages": profiler.summary(),
+    }
+
+
+def bench_scale(args) -> None:
+    if args.write:
+        write_scale_corpus(args.write, args.scale_factor, args.dir)
+        return
+    if args.run:
+        print(json.dumps(_run_scale_corpus(args.run, args.file), ensure_ascii=False))
+        return
+    corpora = [c for c in args.corpus.split(",") if c]
+    unknown = set(corpora) - set(CORPORA)
+    if unknown:
+        print(f"错误: 未知语料 {', '.join(sorted(unknown))}（可选 {','.join(CORPORA)}）", file=sys.stderr)
+        sys.exit(2)
+    scales = [int(s) for s in args.scale.split(",")]
+    rows, stage_rows = [], []
+    for corpus in corpora:
+        for scale in scales:
+            with tempfile.TemporaryDirectory(prefix=f"bench-scale-{corpus}-") as tmp:
+                # 在子进程里生成语料：ru_maxrss 会随 fork/exec 继承
+                subprocess.run([sys.executable, os.path.abspath(__file__), "scale", "--write", corpus,
+                                "--scale-factor", str(scale), "--dir", tmp], check=True)
+                row = run_isolated(["scale", "--run", corpus, "--file", scale_corpus_path(corpus, tmp)])
+            # 每 1× 的耗时：线性扩展时各规模相同，超线性时随规模上升
+            row.update(scale=f"{scale}x", ms_per_1x=round(row["seconds"] * 1000 / scale, 1))
+            rows.append(row)
+            print(f"  {corpus} {scale}x: {row['seconds']}s", file=sys.stderr)
+            for name, s in row["stages"].items():
+                seconds = s["self_ms"] / 1000
+                stage_rows.append({
+                    "corpus": corpus, "scale": f"{scale}x", "stage": name, "calls": s["calls"],
+                    "self_ms": round(s["self_ms"], 1),
+                    "mb_per_s": round(s["bytes"] / 1024 / 1024 / seconds, 1) if s["bytes"] and seconds else "-",
+                    "items_per_s": round(s["items"] / seconds) if s["items"] and seconds else "-",
+                    "rss_growth_mb": round(s["rss_growth_kb"] / 1024, 1),
+                })
+    print_table(rows, ["corpus", "scale", "input_mb", "seconds", "ms_per_1x", "mb_per_s", "peak_rss_mb", "result"])
+    print()
+    print_table(stage_rows, ["corpus", "scale", "stage", "calls", "self_ms", "mb_per_s", "items_per_s",
+                             "rss_growth_mb"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "results": rows}, f, ensure_ascii=False, indent=1)
+        print(f"结果已保存到: {args.json}", file=sys.stderr)
+
+
+def write_stub_pages(tmp: str, pages: int) -> list[tuple[int, str]]:
+    """给桩服务器用的「页面图片」：内容是 UTF-8 文本，桩服务器原样返回，便于核对页序"""
+    out = []
+    for i in range(1, pages + 1):
+        path = os.path.join(tmp, f"page-{i}.png")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"第 {i} 页")
+        out.append((i, path))
+    return out
+
+
+def _drain(*stubs) -> None:
+    """等落败的请求在桩服务器上跑完，在途统计才完整"""
+    while any(stub.in_flight for stub in stubs):
+        time.sleep(0.05)
+
+
+def bench_hedge(args) -> None:
+    import ocr
+    from ocr_client import OCRClient
+    from ocr_hedge import HedgedOCR, Provider
+    from ocr_stub import StubServer
+
+    def provider(name, stub):
+        client = OCRClient(stub.url, "x", rate=1000, burst=args.workers, pool_size=args.workers)
+        return Provider(name, client, name, ocr.PROMPT, lambda uri: ocr.build_payload(name, uri))
+
+    rows, ok = [], True
+    with tempfile.TemporaryDirectory(prefix="bench-hedge-") as tmp:
+        pages = write_stub_pages(tmp, args.pages)
+        for variant in ("single", "hedged"):
+            # 主服务商有长尾，备用服务商没有；两种变体用同一随机种子，长尾落在同样的请求序号上
+            with StubServer(delay=args.delay, jitter=args.delay, slow_rate=args.slow_rate,
+                            slow_delay=args.slow_delay, seed=1) as slow, \
+                    StubServer(delay=args.delay, jitter=args.delay, seed=2) as fast:
+                providers = [provider("primary", slow)] + ([provider("backup", fast)] if variant == "hedged" else [])
+                hedge = HedgedOCR(providers, percentile=args.percentile, hedge_after=args.hedge_after,
+                                  min_samples=4, max_in_flight=args.workers)
+                recognize = lambda path, label, on_delta=None: ocr.ocr_image_hedged(path, hedge, None, label)
+                start = time.perf_counter()
+                with contextlib.redirect_stderr(io.StringIO()):
+                    results, failed = ocr.ocr_pages(pages, len(pages), recognize, args.workers)
+                seconds = time.perf_counter() - start
+                _drain(slow, fast)
+                in_flight = max(slow.stats()["max_in_flight"], fast.stats()["max_in_flight"])
+            right = results == [f"第 {i} 页" for i in range(1, len(pages) + 1)] and not failed
+            bounded = in_flight <= args.workers
+            ok = ok and right and bounded
+            rows.append({
+                "variant": variant, "seconds": round(seconds, 2), "hedges": hedge.hedges, "deferred": hedge.deferred,
+                "wins": "/".join(str(p.wins) for p in providers),
+                "requests": slow.stats()["requests"] + fast.stats()["requests"],
+                "max_in_flight": f"{in_flight}/{args.workers}",
+                "result": "ok" if right and bounded else ("页序或内容错误" if not right else "在途请求超限"),
+            })
+            print(f"  {variant}: {seconds:.2f}s", file=sys.stderr)
+    print_table(rows, ["variant", "seconds", "hedges", "deferred", "wins", "requests", "max_in_flight", "result"])
+    print(hedge.report(), file=sys.stderr)
+    if not ok:
+        sys.exit(1)
+
+
+def bench_retry(args) -> None:
+    import ocr
+    from ocr_client import OCRClient
+    from ocr_stub import StubServer
+
+    with tempfile.TemporaryDirectory(prefix="bench-retry-") as tmp, \
+            StubServer(delay=args.delay, jitter=args.delay, fail_rate=args.fail_rate,
+                       max_failures=args.max_failures, retry_after=args.retry_after, seed=1) as stub:
+        pages = write_stub_pages(tmp, args.pages)
+        client = OCRClient(stub.url, "x", rate=args.rate, burst=args.workers, pool_size=args.workers)
+        recognize = lambda path, label, on_delta=None: ocr.ocr_image(path, client, "stub", None, label, on_delta)
+        start = time.perf_counter()
+        with contextlib.redirect_stderr(io.StringIO()) as log:
+            results, failed = ocr.ocr_pages(pages, len(pages), recognize, args.workers)
+        seconds = time.perf_counter() - start
+        stats = stub.stats()
+    right = results == [f"第 {i} 页" for i in range(1, len(pages) + 1)] and not failed
+    retries = log.getvalue().count("后重试")
+    print_table([{"pages": len(pages), "fail_rate": args.fail_rate, "requests": stats["requests"],
+                  "server_errors": stats["failures"], "client_retries": retries, "seconds": round(seconds, 2),
+                  "result": "ok" if right and retries == stats["failures"] else f"失败页 {failed}"}],
+                ["pages", "fail_rate", "requests", "server_errors", "client_retries", "seconds", "result"])
+    print(client.stream_summary(), file=sys.stderr)
+    if not right or retries != stats["failures"]:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scripts/ 流水线基准测试")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("encode", help="OCR 请求体编码的峰值内存")
+    p.add_argument("--size-mb", type=int, default=200, help="合成输入文件大小 (默认 200 MB)")
+    p.add_argument("--variant", choices=["legacy", "stream"], help=argparse.SUPPRESS)
+    p.add_argument("--file", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_encode)
+
+    p = sub.add_parser("thesis", help="论文清洗流水线的吞吐和峰值内存")
+    p.add_argument("--pages", default="500,5000", help="合成论文页数，逗号分隔 (默认 500,5000)")
+    p.add_argument("--variant", choices=["inmemory", "stream", "mmap"], help=argparse.SUPPRESS)
+    p.add_argument("--file", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_thesis)
+
+    p = sub.add_parser("pages", help="form-feed 页索引的打开耗时、随机读页和峰值内存")
+    p.add_argument("--pages", type=int, default=50000, help="合成论文页数 (默认 50000)")
+    p.add_argument("--variant", choices=["split", "mmap", "sidecar"], help=argparse.SUPPRESS)
+    p.add_argument("--file", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_pages)
+
+    p = sub.add_parser("docx", help="docx 段落读取的耗时和峰值内存")
+    p.add_argument("--scale", default="1,10", help="相对巴格达 docx（%d 段）的倍数，逗号分隔 (默认 1,10)" % DOCX_PARAGRAPHS)
+    p.add_argument("--variant", choices=["python-docx", "stream"], help=argparse.SUPPRESS)
+    p.add_argument("--write", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--file", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_docx)
+
+    p = sub.add_parser("match", help="目录→正文模糊匹配的 normalize 调用次数与耗时")
+    p.add_argument("--poems", type=int, default=100, help="合成诗数 (默认 100，约 2000 段)")
+    p.set_defaults(func=bench_match)
+
+    p = sub.add_parser("scale", help="三条流水线在 1×/10×/100× 合成语料上的分阶段吞吐和峰值内存")
+    p.add_argument("--scale", default="1,10,100", help="相对现有书稿的倍数，逗号分隔 (默认 1,10,100)")
+    p.add_argument("--corpus", default=",".join(CORPORA), help=f"语料，逗号分隔 (默认 {','.join(CORPORA)})")
+    p.add_argument("--json", metavar="PATH", help="另存完整结果（含各阶段明细）为 JSON，便于跨版本比较")
+    p.add_argument("--write", choices=CORPORA, help=argparse.SUPPRESS)
+    p.add_argument("--scale-factor", type=int, default=1, help=argparse.SUPPRESS)
+    p.add_argument("--dir", help=argparse.SUPPRESS)
+    p.add_argument("--run", choices=CORPORA, help=argparse.SUPPRESS)
+    p.add_argument("--file", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_scale)
+
+    p = sub.add_parser("hedge", help="对冲请求：两个本地桩服务器，主服务商有长尾（核对页序与在途请求上限）")
+    p.add_argument("--pages", type=int, default=40, help="页数 (默认 40)")
+    p.add_argument("--workers", type=int, default=4, help="并发页数，也是每家的在途请求上限 (默认 4)")
+    p.add_argument("--delay", type=float, default=0.05, help="桩服务器基础延迟，秒 (默认 0.05)")
+    p.add_argument("--slow-rate", type=float, default=0.15, help="主服务商慢请求的比例 (默认 0.15)")
+    p.add_argument("--slow-delay", type=float, default=2.0, help="慢请求额外延迟，秒 (默认 2)")
+    p.add_argument("--percentile", type=float, default=0.9, help="对冲阈值分位数 (默认 0.9)")
+    p.add_argument("--hedge-after", type=float, default=0.5, help="样本不足时的对冲阈值，秒 (默认 0.5)")
+    p.set_defaults(func=bench_hedge)
+
+    p = sub.add_parser("retry", help="重试与限速：本地桩服务器按比例返回 429/500/503（核对每页都成功且页序正确）")
+    p.add_argument("--pages", type=int, default=11, help="页数 (默认 11)")
+    p.add_argument("--workers", type=int, default=4, help="并发页数 (默认 4)")
+    p.add_argument("--fail-rate", type=float, default=0.3, help="桩服务器返回错误的概率 (默认 0.3)")
+    p.add_argument("--max-failures", type=int, default=2, help="同一页最多连续失败几次，须小于重试次数 (默认 2)")
+    p.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After，秒 (默认 1)")
+    p.add_argument("--rate", type=float, default=10.0, help="客户端限速，请求/秒 (默认 10)")
+    p.add_argument("--delay", type=float, default=0.05, help="桩服务器基础延迟，秒 (默认 0.05)")
+    p.set_defaults(func=bench_retry)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Rebuild every book under books/ in parallel, one process-pool task per
+book directory.
+
+Each task runs the steps that apply to its directory, in order:
+
+  import   books/<slug>/import.json + a .docx  → source.md        (docx_book.py)
+  essays   source.md sections → src/content/essays/*.md            (extract_missing_essays.py)
+  thesis   full_text.txt → cleaned thesis essay                    (clean_zhangqiuge.py)
+
+The thesis output is polished by hand after generation and the step
+overwrites it, so it only runs when asked for with --steps.
+
+Output from each book is captured and printed in directory order once
+all tasks finish, so logs do not interleave. A failing book is reported
+with its error and does not stop the others; the exit status is 1 if
+any book failed. The essay manifest is merged from all tasks and saved
+once by the parent process.
+
+Usage (from anywhere):
+  python3 scripts/build_books.py                    # all books, all cores
+  python3 scripts/build_books.py -j 1 zhungaer1984  # one book, in-process
+  python3 scripts/build_books.py --steps import,essays,thesis
+"""
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from dataclasses import dataclass, field
+
+import docx_book
+import extract_missing_essays as essays
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOKS_DIR = 'books'
+ALL_STEPS = ('import', 'essays', 'thesis')
+DEFAULT_STEPS = ('import', 'essays')
+# Per-thesis wrapper modules, keyed by book directory.
+THESIS_WRAPPERS = {'essay4_zhangqiuge': 'clean_zhangqiuge'}
+
+
+@dataclass
+class BookResult:
+    book: str
+    steps: list[str] = field(default_factory=list)
+    log: str = ''
+    error: str | None = None
+    seconds: float = 0.0
+    manifest_entry: dict | None = None
+    manifest_outputs: dict = field(default_factory=dict)
+
+
+def _has_docx(book_dir, config):
+    if 'docx' in config: return os.path.exists(os.path.join(book_dir, config['docx']))
+    return bool(glob.glob(os.path.join(glob.escape(book_dir), '*.docx')))
+
+
+def build_book(book, steps, manifest, force=False, docx_cache=None):
+    """Run the applicable steps for one book directory. Never raises.
+
+    docx_cache is passed to docx_book.load_store so a long-running caller
+    (watch_books.py) keeps parsed documents between runs.
+    """
+    result = BookResult(book)
+    book_dir = os.path.join(BOOKS_DIR, book)
+    buf = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(buf), redirect_stderr(buf):
+            if 'import' in steps and os.path.exists(os.path.join(book_dir, docx_book.CONFIG_NAME)):
+                if _has_docx(book_dir, docx_book.load_config(book_dir)):
+                    print(docx_book.import_book(book_dir, cache=docx_cache))
+                    result.steps.append('import')
+                else:
+                    print(f"import: no .docx in {book_dir}, keeping the existing {docx_book.OUTPUT_NAME}")
+            if 'essays' in steps and book in essays.books and os.path.exists(os.path.join(book_dir, 'source.md')):
+                changed = essays.update_book(book, manifest, force)
+                result.steps.append('essays' if changed else 'essays (unchanged)')
+                entry = result.manifest_entry = manifest['books'].get(book)
+                if entry:
+                    result.manifest_outputs = {p: manifest['outputs'].get(p) for p in entry['outputs']}
+            if 'thesis' in steps and book in THESIS_WRAPPERS:
+                __import__(THESIS_WRAPPERS[book]).main([])
+                result.steps.append('thesis')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            result.error = str(e.code)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        buf.write(traceback.format_exc())
+    result.log = buf.getvalue()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def list_books(names=None):
+    found = sorted(d for d in os.listdir(BOOKS_DIR) if os.path.isdir(os.path.join(BOOKS_DIR, d)))
+    if not names: return found
+    missing = [n for n in names if n not in found]
+    if missing:
+        raise SystemExit(f"Unknown book directories: {', '.join(missing)}")
+    return [d for d in found if d in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild all books in parallel")
+    parser.add_argument("books", nargs="*", help="book directory names (default: every directory under books/)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count; 1 runs in-process)")
+    parser.add_argument("--steps", default=",".join(DEFAULT_STEPS),
+                        help=f"comma-separated steps from {','.join(ALL_STEPS)} (default: {','.join(DEFAULT_STEPS)})")
+    parser.add_argument("--force", action="store_true", help="ignore the essay manifest")
+    args = parser.parse_args()
+
+    steps = [s for s in args.steps.split(",") if s]
+    unknown = set(steps) - set(ALL_STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    os.chdir(ROOT)
+    books = list_books(args.books)
+    manifest = essays.load_manifest()
+    before = json.dumps(manifest, sort_keys=True)
+    start = time.perf_counter()
+
+    results = {}
+    jobs = max(1, min(args.jobs, len(books)))
+    if jobs == 1:
+        for book in books:
+            results[book] = build_book(book, steps, manifest, args.force)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(build_book, book, steps, manifest, args.force): book for book in books}
+            for future in as_completed(futures):
+                book = futures[future]
+                try:
+                    results[book] = future.result()
+                except Exception as e:  # the worker process itself died
+                    results[book] = BookResult(book, error=f"{type(e).__name__}: {e}")
+
+    failed = []
+    for book in books:
+        r = results[book]
+        status = f"FAILED: {r.error}" if r.error else ", ".join(r.steps) or "nothing to do"
+        print(f"[{book}] {status} ({r.seconds:.2f}s)")
+        for line in r.log.splitlines():
+            print(f"    {line}")
+        if r.error:
+            failed.append(book)
+        elif r.manifest_entry is not None:
+            manifest['books'][book] = r.manifest_entry
+            manifest['outputs'].update(r.manifest_outputs)
+
+    if json.dumps(manifest, sort_keys=True) != before:
+        essays.save_manifest(manifest)
+    print(f"{len(books) - len(failed)}/{len(books)} books built in {time.perf_counter() - start:.2f}s "
+          f"with {jobs} worker(s)", file=sys.stderr)
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Import a poetry-collection docx (books/<slug>/*.docx) into source.md.
+
+One forward pass over the paragraphs classifies the layout:
+
+  title → front matter (作者小传) → 目录 / 卷之… TOC blocks → volume bodies → 后记
+
+Paragraph text is streamed from word/document.xml (docx_text.py) into a
+packed toc_match.ParagraphStore, and each TOC title is fuzzy-matched
+against its volume body to find where every poem starts.
+
+Anything the detector gets wrong for a particular book can be pinned in
+an optional books/<slug>/import.json. Every key is optional:
+
+  title                display title (default: first non-empty paragraph)
+  docx                 file name inside the book dir (default: the only *.docx)
+  bio                  paragraph index of 作者小传 (default: longest front paragraph)
+  volumes              volume display names, in order
+  toc                  per-volume TOC ranges, [[start, end], ...]
+  body                 per-volume body ranges, [[start, end], ...]
+  afterword            afterword text range, [start, end]
+  skip                 stray TOC lines to ignore, e.g. ["(158)"]
+  afterword_signature  lines appended after the afterword text
+  colophon             lines of the 出版信息 section
+
+Ranges are half-open paragraph indices, as printed by --layout. Pinned
+values win; where detection disagrees a warning goes to stderr.
+
+Usage:
+  python3 scripts/docx_book.py books/weileaiqingbagedabuxianyuan1991
+  python3 scripts/docx_book.py books/<slug> --layout    # detect only, print JSON
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+from dataclasses import dataclass, field, asdict
+
+from docx_text import iter_paragraph_texts
+from profiling import profiler, utf8_len, add_profile_argument
+from toc_match import ParagraphStore, first_line
+
+CONFIG_NAME = 'import.json'
+OUTPUT_NAME = 'source.md'
+TOC_HEADING = '目录'
+AFTERWORD_HEADINGS = ('后记', '跋')
+# This many consecutive non-empty paragraphs without a page number end the TOC.
+TOC_END_RUN = 8
+
+VOLUME_RE = re.compile(r'^卷之[一二三四五六七八九十]+')
+VOLUME_COUNT_RE = re.compile(r'[（(]\d+首[)）]$')
+PAGE_RE = re.compile(r'[\t\s]*[\(（]?(\d+)[）\)·\s.]*$')
+TRAILING_LEADER_RE = re.compile(r'[·…，、]+$')
+DATE_RE = re.compile(r'^\d{4}年')
+
+
+def parse_page(text):
+    m = PAGE_RE.search(text)
+    if m: return m.group(1), text[:m.start()].strip()
+    return None, text.strip()
+
+
+def clean_title(title):
+    return TRAILING_LEADER_RE.sub('', title).strip()
+
+
+def volume_name(text):
+    _, name = parse_page(text)
+    return VOLUME_COUNT_RE.sub('', clean_title(name)).strip()
+
+
+@dataclass
+class Volume:
+    name: str
+    toc: tuple[int, int]
+    body: tuple[int, int] | None = None
+
+
+@dataclass
+class Layout:
+    paragraphs: int
+    title: int | None = None
+    bio: int | None = None
+    volumes: list[Volume] = field(default_factory=list)
+    afterword: tuple[int, int] | None = None
+
+
+@dataclass
+class TocEntry:
+    title: str
+    page: str
+
+
+def detect_layout(store):
+    """Classify the document in a single pass over the paragraphs."""
+    n = len(store)
+    layout = Layout(paragraphs=n)
+    state = 'front'
+    bio_len = 0
+    marks = []          # [name, toc_start, last_paged_or_None]
+    body_marks = {}     # volume name -> index of its heading in the body
+    toc_end = None
+    run = 0
+    for i in range(n):
+        t = store.text(i)
+        if not t: continue
+        if state == 'front':
+            if layout.title is None:
+                layout.title = i
+                continue
+            if t == TOC_HEADING or VOLUME_RE.match(t):
+                state = 'toc'
+            else:
+                if len(t) > bio_len: layout.bio, bio_len = i, len(t)
+                continue
+        if state == 'toc':
+            if t == TOC_HEADING:
+                if not marks: marks.append(['', i + 1, None])
+                continue
+            if VOLUME_RE.match(t):
+                name = volume_name(t)
+                if any(m[0] == name for m in marks):
+                    # The same 卷之 heading again: the TOC is over, this opens the body.
+                    state, body_marks[name] = 'body', i
+                elif marks and not marks[-1][0] and marks[-1][2] is None:
+                    marks[-1][:2] = [name, i + 1]
+                else:
+                    marks.append([name, i + 1, None])
+                continue
+            if t in AFTERWORD_HEADINGS:
+                state = 'after'
+            elif parse_page(t)[0]:
+                if not marks: marks.append(['', i, None])
+                marks[-1][2], run = i, 0
+                continue
+            else:
+                run += 1
+                if run < TOC_END_RUN: continue
+                state = 'body'
+        if state == 'body':
+            if VOLUME_RE.match(t):
+                body_marks.setdefault(volume_name(t), i)
+            elif t in AFTERWORD_HEADINGS:
+                state = 'after'
+        if state == 'after' and layout.afterword is None:
+            layout.afterword = (i + 1, n)
+            # Anything after the afterword heading is afterword text.
+            break
+
+    for k, (name, start, last_paged) in enumerate(marks):
+        end = marks[k + 1][1] - 1 if k + 1 < len(marks) else (last_paged or start - 1) + 1
+        layout.volumes.append(Volume(name, (start, end)))
+    if marks:
+        toc_end = layout.volumes[-1].toc[1]
+        body_end = layout.afterword[0] - 1 if layout.afterword else n
+        _locate_bodies(store, layout.volumes, body_marks, toc_end, body_end)
+    return layout
+
+
+def _locate_bodies(store, volumes, body_marks, toc_end, body_end):
+    """Volume bodies start at their repeated 卷之 heading, or else where the
+    volume's first TOC title first appears after the previous volume."""
+    starts = []
+    prev = toc_end
+    for v in volumes:
+        if v.name in body_marks:
+            start = body_marks[v.name] + 1
+        elif not starts:
+            start = toc_end
+        else:
+            entries = parse_toc(store, *v.toc)
+            start = store.first_match(first_line(entries[0].title), prev + 1, body_end) if entries else None
+            if start is None: start = prev
+        starts.append(start)
+        prev = start
+    for k, v in enumerate(volumes):
+        end = body_end
+        if k + 1 < len(volumes):
+            nxt = volumes[k + 1].name
+            end = body_marks[nxt] if nxt in body_marks else starts[k + 1]
+        v.body = (starts[k], end)
+
+
+@profiler.timed('toc_parse')
+def parse_toc(store, start, end, skip=()):
+    """TOC entries in [start, end). Lines without a page number are the
+    wrapped head of the next paged entry."""
+    entries, buf = [], []
+    for i in range(start, end):
+        t = store.text(i)
+        if not t or t in skip or t == TOC_HEADING or VOLUME_RE.match(t): continue
+        page, title = parse_page(t)
+        title = clean_title(title)
+        if page:
+            entries.append(TocEntry(clean_title(''.join(buf) + title), page))
+            buf = []
+        elif title:
+            buf.append(title)
+    if buf: entries.append(TocEntry(clean_title(''.join(buf)), ''))
+    return entries
+
+
+def find_poem_starts(store, toc, body_start, body_end):
+    starts = []
+    prev_end = body_start
+    for entry in toc:
+        fl = first_line(entry.title)
+        if not fl:
+            starts.append(None)
+            continue
+        # Always take the FIRST match after the TOC/previous poem
+        body_pos = store.first_match(fl, max(prev_end, body_start), body_end)
+        starts.append(body_pos)
+        if body_pos: prev_end = body_pos + 1
+    return starts
+
+
+def get_poem_end(store, starts, idx, body_end):
+    current_start = starts[idx]
+    if current_start is None: return body_end
+    if idx + 1 < len(starts) and starts[idx + 1]:
+        return starts[idx + 1]
+    for i in range(current_start, body_end):
+        if DATE_RE.match(store.text(i)): return i + 1
+    return body_end
+
+
+def get_poem_body(store, start, end_limit):
+    if start is None: return []
+    result = []
+    for i in range(start, end_limit):
+        t = store.text(i)
+        result.append(t)
+        if DATE_RE.match(t): break  # Include date line
+    while result and not result[0]: result.pop(0)
+    while result and not result[-1]: result.pop()
+    return result
+
+
+def _range(value):
+    return tuple(value) if value is not None else None
+
+
+def apply_config(layout, config):
+    """Overlay pinned values from import.json, warning where they differ."""
+    def pin(what, detected, pinned):
+        if detected != pinned:
+            print(f"  note: {what} detected as {detected}, using pinned {pinned}", file=sys.stderr)
+        return pinned
+
+    if 'bio' in config: layout.bio = pin('bio', layout.bio, config['bio'])
+    if 'afterword' in config:
+        layout.afterword = pin('afterword', layout.afterword, _range(config['afterword']))
+    count = max(len(layout.volumes), *(len(config.get(k, ())) for k in ('volumes', 'toc', 'body')))
+    while len(layout.volumes) < count:
+        layout.volumes.append(Volume('', (0, 0)))
+    for k, v in enumerate(layout.volumes):
+        if k < len(config.get('volumes', ())): v.name = config['volumes'][k]
+        if k < len(config.get('toc', ())): v.toc = pin(f'volume {k + 1} toc', v.toc, _range(config['toc'][k]))
+        if k < len(config.get('body', ())): v.body = pin(f'volume {k + 1} body', v.body, _range(config['body'][k]))
+    return layout
+
+
+def load_config(book_dir):
+    path = os.path.join(book_dir, CONFIG_NAME)
+    if not os.path.exists(path): return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_docx(book_dir, config):
+    if 'docx' in config: return os.path.join(book_dir, config['docx'])
+    found = sorted(glob.glob(os.path.join(glob.escape(book_dir), '*.docx')))
+    if len(found) != 1:
+        raise SystemExit(f"Expected exactly one .docx in {book_dir}, found {len(found)}; set \"docx\" in {CONFIG_NAME}")
+    return found[0]
+
+
+def render(store, layout, config):
+    skip = set(config.get('skip', ()))
+    volumes = []
+    for v in layout.volumes:
+        toc = parse_toc(store, *v.toc, skip=skip)
+        starts = find_poem_starts(store, toc, *v.body) if v.body else [None] * len(toc)
+        volumes.append((v, toc, starts))
+
+    output = []
+    title = config.get('title') or (store.text(layout.title) if layout.title is not None else '')
+    output.append(f'# {title}\n')
+    if layout.bio is not None:
+        output.append('## 作者小传\n')
+        output.append(store.text(layout.bio) + '\n')
+    output.append('## 目录\n')
+    for k, (v, toc, _) in enumerate(volumes):
+        output.append(('\n' if k else '') + f'{v.name}（{len(toc)}首）')
+        for e in toc: output.append(f'　　{e.title}' + (f'\t{e.page}' if e.page else ''))
+    output.append('\n---\n')
+
+    for v, toc, starts in volumes:
+        body_end = v.body[1] if v.body else 0
+        output.append(f'## {v.name}（{len(toc)}首）\n')
+        for idx, entry in enumerate(toc):
+            parts = entry.title.split('／', 1) if '／' in entry.title else [entry.title, '']
+            output.append(f'### {parts[0].strip()}')
+            if parts[1]: output.append(f'　　　　{parts[1].strip()}')
+            output.append('')
+            start = starts[idx]
+            if start is None:
+                output.append('[诗歌内容缺失]')
+            else:
+                output.extend(get_poem_body(store, start, get_poem_end(store, starts, idx, body_end)))
+            output.append(f'\n[p{entry.page}]\n' if entry.page else '\n')
+        output.append('* * *\n')
+
+    if layout.afterword:
+        output.append('## 后记\n')
+        for i in range(*layout.afterword):
+            if store.text(i): output.append(store.text(i))
+        if config.get('afterword_signature'):
+            output.append('\n' + '\n'.join(config['afterword_signature']) + '\n')
+    if config.get('colophon'):
+        output.append('## 出版信息\n')
+        output.append('\n'.join(config['colophon']) + '\n')
+
+    missing = sum(s is None for _, _, starts in volumes for s in starts)
+    return '\n'.join(output), sum(len(toc) for _, toc, _ in volumes), missing
+
+
+def _read_store(doc_path):
+    with profiler.stage('paragraph_store'):
+        return ParagraphStore(profiler.iterate('docx_read', iter_paragraph_texts(doc_path), size=utf8_len))
+
+
+def load_store(doc_path, cache=None):
+    """ParagraphStore for a docx; with a cache dict, reuse it while the
+    file's size and mtime are unchanged (watch mode keeps one around)."""
+    if cache is None:
+        return _read_store(doc_path)
+    st = os.stat(doc_path)
+    key = (doc_path, st.st_size, st.st_mtime_ns)
+    store = cache.get(key)
+    if store is None:
+        for stale in [k for k in cache if k[0] == doc_path]:
+            del cache[stale]
+        store = cache[key] = _read_store(doc_path)
+    return store
+
+
+def import_book(book_dir, out_path=None, cache=None):
+    """Build <book_dir>/source.md; returns a one-line summary."""
+    config = load_config(book_dir)
+    store = load_store(find_docx(book_dir, config), cache)
+    with profiler.stage('layout_detect'):
+        layout = apply_config(detect_layout(store), config)
+    with profiler.stage('render'):
+        text, poems, missing = render(store, layout, config)
+    out_path = out_path or os.path.join(book_dir, OUTPUT_NAME)
+    try:
+        with open(out_path, encoding='utf-8') as f: unchanged = f.read() == text
+    except FileNotFoundError:
+        unchanged = False
+    # Leave an identical file alone so its mtime does not trigger downstream rebuilds.
+    if not unchanged:
+        with profiler.stage('write', bytes=utf8_len(text)), open(out_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return (f"{'Unchanged' if unchanged else 'Generated'} {out_path}: "
+            f"{len(layout.volumes)} volumes, {poems} poems, {missing} missing")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a poetry-collection docx into source.md")
+    parser.add_argument("book_dir", help="books/<slug>")
+    parser.add_argument("-o", "--output", help=f"output path (default: <book_dir>/{OUTPUT_NAME})")
+    parser.add_argument("--layout", action="store_true", help="print the detected layout as JSON and exit")
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiler.enable(args.profile)
+
+    if args.layout:
+        store = load_store(find_docx(args.book_dir, load_config(args.book_dir)))
+        print(json.dumps(asdict(detect_layout(store)), ensure_ascii=False, indent=2))
+        return 0
+    print(import_book(args.book_dir, args.output))
+    profiler.write()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Stream paragraph text out of a .docx without building the python-docx
+object model.
+
+word/document.xml is iterparsed straight from the zip and each body
+paragraph's text is yielded as soon as its closing tag is seen; parsed
+elements are dropped immediately, so memory does not grow with the
+document.
+
+The result matches `[p.text for p in docx.Document(path).paragraphs]`:
+
+- only w:p elements that are direct children of w:body (paragraphs in
+  tables, text boxes and content controls are skipped, as python-docx
+  does)
+- text comes from w:r runs and w:hyperlink/w:r runs directly inside the
+  paragraph
+- w:tab and w:ptab become '\\t', w:cr and text-wrapping w:br become '\\n',
+  w:noBreakHyphen becomes '-', page/column breaks are dropped
+
+Usage:
+  from docx_text import iter_paragraph_texts
+  store = ParagraphStore(iter_paragraph_texts(path))
+"""
+
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+
+DOCUMENT_PART = 'word/document.xml'
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_BODY = W + 'body'
+_P = W + 'p'
+_R = W + 'r'
+_HYPERLINK = W + 'hyperlink'
+_T = W + 't'
+_BR = W + 'br'
+_BR_TYPE = W + 'type'
+# Run children with a fixed text equivalent; w:t and w:br are handled apart.
+_RUN_TEXT = {W + 'tab': '\t', W + 'ptab': '\t', W + 'cr': '\n', W + 'noBreakHyphen': '-'}
+
+
+def iter_paragraph_texts(path: str) -> Iterator[str]:
+    """Yield the text of every body paragraph, in document order."""
+    with zipfile.ZipFile(path) as z, z.open(DOCUMENT_PART) as f:
+        # Tags of the open elements below w:body; stack[0] is a body-level block.
+        stack = []
+        parts = []
+        body = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if body is not None:
+                    stack.append(tag)
+                elif tag == _BODY:
+                    body = elem
+                continue
+            if not stack:
+                continue
+            stack.pop()
+            if not stack:
+                if tag == _P:
+                    yield ''.join(parts)
+                    parts.clear()
+                # Drop the finished block (paragraph, table, sectPr) from the tree.
+                body.clear()
+                continue
+            if stack[0] != _P:
+                continue
+            # A run child directly in the paragraph, or in a hyperlink in the paragraph.
+            if len(stack) == 2 and stack[1] == _R or len(stack) == 3 and stack[1] == _HYPERLINK and stack[2] == _R:
+                if tag == _T:
+                    if elem.text: parts.append(elem.text)
+                elif tag == _BR:
+                    if elem.get(_BR_TYPE, 'textWrapping') == 'textWrapping': parts.append('\n')
+                elif tag in _RUN_TEXT:
+                    parts.append(_RUN_TEXT[tag])
+
+
+def read_paragraph_texts(path: str) -> list[str]:
+    return list(iter_paragraph_texts(path))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 scripts/docx_text.py <file.docx>", file=sys.stderr)
+        sys.exit(1)
+    for text in iter_paragraph_texts(sys.argv[1]):
+        print(text)
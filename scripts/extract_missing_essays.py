@@ -1,6 +1,29 @@
+"""
+Split the front/back-matter sections (作者小传, 序, 后记, 出版信息 …) out of
+books/*/source.md into src/content/essays/<book>-<type>.md.
+
+An essay file is written when it is missing, when it still lacks front
+matter, or when it is exactly what this script generated last time. A
+file someone has edited by hand is never overwritten, and a file whose
+bytes would not change is not touched at all, so its mtime stays put.
+
+A manifest (.cache/essays-manifest.json) records the size, mtime and
+sha256 of every source.md and essay file. A book whose source and
+outputs are all unchanged since the last run is skipped without being
+read, which makes a no-op run essentially free.
+
+Usage (from the repo root):
+  python3 scripts/extract_missing_essays.py [--force] [--profile PATH]
+"""
+
 import os
 import re
+import sys
 import json
+import hashlib
+import argparse
+
+from profiling import profiler, utf8_len, add_profile_argument
 
 books = [
     "hanxuema1995",
@@ -23,63 +46,182 @@ mapping = {
     "出版信息": "publication"
 }
 
+MANIFEST_PATH = os.environ.get("ESSAY_MANIFEST", ".cache/essays-manifest.json")
+MANIFEST_VERSION = 1
+
+
 def clean_title(title):
     return title.replace('##', '').strip()
 
-for book in books:
-    source_path = f"books/{book}/source.md"
-    if not os.path.exists(source_path):
-        continue
-        
-    with open(source_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-        
+
+def essays_for(book, content):
+    """Yield (raw_title, slug, clean_name, text) for each essay section of a source.md."""
     # Split by ## headers
     parts = re.split(r'^(##\s+.*)$', content, flags=re.MULTILINE)
-    
-    current_title = None
-    
+
     for i in range(1, len(parts), 2):
         header = parts[i]
         text = parts[i+1].strip()
-        
+
         raw_title = clean_title(header)
-        
+
         # Match with mapping
         essay_type = None
         clean_name = raw_title
-        
+
         for key, val in mapping.items():
             if raw_title.startswith(key):
                 essay_type = val
                 clean_name = key
                 break
-                
+
         if essay_type:
-            # We found an essay section
-            slug = f"{book}-{essay_type}"
-            essay_path = f"src/content/essays/{slug}.md"
-            
             # Special case for zhungaer1984 preface / afterword exact titles
             if raw_title == "开拓精神万岁（序言）":
                 clean_name = "序·开拓精神万岁"
             elif raw_title.startswith("跋：从大漠"):
                 clean_name = "跋·从大漠升起袅袅的笛声"
-            
-            print(f"[{book}] Found '{raw_title}' -> will save as '{slug}' (Title: {clean_name})")
-            
-            # Create if not exists or if it's missing frontmatter
-            write = False
-            if not os.path.exists(essay_path):
-                write = True
-            else:
-                with open(essay_path, 'r') as ef:
-                    existing = ef.read()
-                    if "---" not in existing:
-                        write = True
-            
-            if write:
-                with open(essay_path, 'w', encoding='utf-8') as ef:
-                    ef.write(f"---\ntitle: \"{clean_name}\"\n---\n\n{text}\n")
-                print(f"Created {essay_path}")
 
+            yield raw_title, f"{book}-{essay_type}", clean_name, text
+
+
+def render_essay(clean_name, text):
+    return f"---\ntitle: \"{clean_name}\"\n---\n\n{text}\n".encode('utf-8')
+
+
+@profiler.timed("file_state")
+def file_state(path, data=None):
+    """size / mtime_ns / sha256 of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+    except FileNotFoundError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def unchanged(path, recorded):
+    """True if path still has the size and mtime recorded in the manifest."""
+    if recorded is None:
+        return not os.path.exists(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return st.st_size == recorded["size"] and st.st_mtime_ns == recorded["mtime_ns"]
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "books": {}, "outputs": {}}
+
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH) or ".", exist_ok=True)
+    tmp = f"{MANIFEST_PATH}.tmp.{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def should_write(essay_path, data, recorded):
+    """Write new essays, ones still missing front matter, and ones left
+    exactly as we generated them; never a hand-edited file, and never
+    when the bytes would not change."""
+    try:
+        with open(essay_path, 'rb') as ef:
+            existing = ef.read()
+    except FileNotFoundError:
+        return True
+    if existing == data:
+        return False
+    if b"---" not in existing:
+        return True
+    return bool(recorded and recorded.get("generated")
+                and hashlib.sha256(existing).hexdigest() == recorded["sha256"])
+
+
+def build_book(book, source_path, manifest):
+    """Write one book's essays; return the paths it owns."""
+    with open(source_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    paths = []
+    sections = profiler.iterate("essay_split", essays_for(book, content), size=lambda e: utf8_len(e[3]))
+    for raw_title, slug, clean_name, text in sections:
+        essay_path = f"src/content/essays/{slug}.md"
+        print(f"[{book}] Found '{raw_title}' -> will save as '{slug}' (Title: {clean_name})")
+        if essay_path in paths:
+            # Two sections map to the same essay (序 / 代序): the first one wins.
+            continue
+        paths.append(essay_path)
+
+        data = render_essay(clean_name, text)
+        recorded = manifest["outputs"].get(essay_path)
+        if should_write(essay_path, data, recorded):
+            with profiler.stage("essay_write", bytes=len(data)), open(essay_path, 'wb') as ef:
+                ef.write(data)
+            print(f"Created {essay_path}")
+            state = file_state(essay_path, data)
+        else:
+            state = file_state(essay_path)
+        if state is not None:
+            state["generated"] = state["sha256"] == hashlib.sha256(data).hexdigest()
+        manifest["outputs"][essay_path] = state
+    return paths
+
+
+def update_book(book, manifest, force=False):
+    """Bring one book's essays up to date.
+
+    Returns False if the book was skipped as unchanged. Only this book's
+    entries in manifest (books[book] and its outputs) are modified, so
+    callers can run books in separate processes and merge the results.
+    """
+    source_path = f"books/{book}/source.md"
+    entry = manifest["books"].get(book)
+    outputs_unchanged = entry and all(unchanged(p, manifest["outputs"].get(p)) for p in entry["outputs"])
+    if not force and outputs_unchanged and unchanged(source_path, entry["source"]):
+        return False
+
+    source = file_state(source_path)
+    if not force and outputs_unchanged and source["sha256"] == entry["source"]["sha256"]:
+        # Touched but not modified: refresh the recorded mtime only.
+        entry["source"] = source
+        return False
+
+    manifest["books"][book] = {"source": source, "outputs": build_book(book, source_path, manifest)}
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract essay sections from books/*/source.md")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and re-split every book")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    profiler.enable(args.profile)
+
+    manifest = load_manifest()
+    before = json.dumps(manifest, sort_keys=True)
+    skipped = 0
+    for book in books:
+        if os.path.exists(f"books/{book}/source.md") and not update_book(book, manifest, args.force):
+            skipped += 1
+
+    if json.dumps(manifest, sort_keys=True) != before:
+        save_manifest(manifest)
+    if skipped:
+        print(f"{skipped} book(s) unchanged since last run, skipped", file=sys.stderr)
+    profiler.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,31 @@
 #!/usr/bin/env python3
 """
 GLM-OCR 批量文档识别脚本
-用法: python3 scripts/glm-ocr.py <文件路径> [--output 输出路径]
+用法: python3 scripts/glm-ocr.py <文件路径> [--output 输出路径] [--workers N] [--pages-per-chunk N]
+      [--no-cache] [--profile 路径]
 
 支持: PDF、JPG、PNG
-需要: BIGMODEL_API_KEY 环境变量
+需要: BIGMODEL_API_KEY 环境变量（BIGMODEL_API_BASE 可改 API 地址，如指向本地桩服务器）
+分段: 多页 PDF 按输出 token 预算切成若干页段（pdfseparate / pdfunite，poppler-utils），
+      并发提交，结果按页序拼接。某段因 max_tokens 被截断（finish_reason=length）时，
+      只把这一段对半拆开重交，不重做整份文件。
+缓存: 同一文件（按内容哈希）的同一页段再次识别时直接读 .cache/ocr/（见 ocr_cache.py）
+输出: 流式（SSE）接收，按页序边收边写入输出文件，每完成一段 fsync（见 ocr_output.py）
 
 示例:
   export BIGMODEL_API_KEY="你的key"
   python3 scripts/glm-ocr.py books/essay1/某篇文章.pdf
   python3 scripts/glm-ocr.py books/essay1/某篇文章.pdf --output output/ocr-result.md
+  python3 scripts/glm-ocr.py books/essay1/整本书.pdf --workers 4 --pages-per-chunk 3 -o output/book.md
 """
 
 import sys
 import os
-import json
-import base64
 import argparse
+import subprocess
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 
 try:
@@ -25,43 +34,29 @@ except ImportError:
     print("需要安装 requests: pip install requests")
     sys.exit(1)
 
-API_BASE = "https://open.bigmodel.cn/api/paas/v4"
-MODEL = "glm-ocr"
-
-
-def encode_file(file_path: str) -> tuple[str, str]:
-    """将文件编码为 base64，返回 (mime_type, base64_data)"""
-    path = Path(file_path)
-    suffix = path.suffix.lower()
-
-    mime_map = {
-        ".pdf": "application/pdf",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-    }
-
-    mime = mime_map.get(suffix)
-    if not mime:
-        raise ValueError(f"不支持的文件格式: {suffix}")
+from ocr_cache import OCRCache, file_digest
+from ocr_client import OCRClient, OCRAPIError
+from ocr_output import PageWriter
+from ocr_payload import DataURIJSONBody, guess_mime
+from profiling import profiler
 
-    with open(path, "rb") as f:
-        data = base64.b64encode(f.read()).decode("utf-8")
+API_BASE = os.environ.get("BIGMODEL_API_BASE", "https://open.bigmodel.cn/api/paas/v4")
+MODEL = "glm-ocr"
+PROMPT = "请识别这张图片/文档中的所有文字内容，以 Markdown 格式输出。保持原文的段落结构、标题层级和标点符号。"
+MAX_TOKENS = 8192
+# 一页中文正文识别结果约 1000–1500 token；每段只用预算的 3/4，给版面密的页留余量
+TOKENS_PER_PAGE = 1500
+CHUNK_TOKEN_BUDGET = MAX_TOKENS * 3 // 4
+DEFAULT_WORKERS = 4
 
-    return mime, data
 
+class TruncatedError(RuntimeError):
+    """输出达到 max_tokens 被截断（finish_reason=length）"""
 
-def ocr_file(file_path: str, api_key: str) -> str:
-    """调用 GLM-OCR 识别文件内容，返回 Markdown 文本"""
-    mime, b64 = encode_file(file_path)
 
-    # 构建请求
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-
-    payload = {
+def build_payload(data_uri: str) -> dict:
+    """构造 chat/completions 请求体"""
+    return {
         "model": MODEL,
         "messages": [
             {
@@ -70,39 +65,169 @@ def ocr_file(file_path: str, api_key: str) -> str:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{mime};base64,{b64}"
+                            "url": data_uri
                         }
                     },
                     {
                         "type": "text",
-                        "text": "请识别这张图片/文档中的所有文字内容，以 Markdown 格式输出。保持原文的段落结构、标题层级和标点符号。"
+                        "text": PROMPT
                     }
                 ]
             }
         ],
-        "max_tokens": 8192,
+        "max_tokens": MAX_TOKENS,
     }
 
-    resp = requests.post(
-        f"{API_BASE}/chat/completions",
-        headers=headers,
-        json=payload,
-        timeout=120,
-    )
 
-    if resp.status_code != 200:
-        print(f"API 错误 ({resp.status_code}): {resp.text}", file=sys.stderr)
-        sys.exit(1)
+def default_pages_per_chunk() -> int:
+    return max(1, CHUNK_TOKEN_BUDGET // TOKENS_PER_PAGE)
+
+
+def split_pdf(pdf_path: str, first: int, last: int, out_dir: str) -> str:
+    """把第 first–last 页另存为一个 PDF（pdfseparate 拆页，pdfunite 合并），返回路径"""
+    pattern = os.path.join(out_dir, f"p{first}-{last}-%d.pdf")
+    subprocess.run(["pdfseparate", "-f", str(first), "-l", str(last), pdf_path, pattern],
+                   check=True, capture_output=True)
+    pages = [pattern % i for i in range(first, last + 1)]
+    if len(pages) == 1:
+        return pages[0]
+    out = os.path.join(out_dir, f"pages-{first}-{last}.pdf")
+    subprocess.run(["pdfunite", *pages, out], check=True, capture_output=True)
+    for page in pages:
+        os.unlink(page)
+    return out
+
+
+def _recognize(file_path: str, client: OCRClient, label: str = "",
+               on_delta: Callable[[str], None] | None = None) -> tuple[str, bool]:
+    """发一次流式请求，返回 (文字, 是否被截断)"""
+    mime = guess_mime(file_path)
+    # JSON 请求体从 mmap 流式编码，大 PDF 不会整份读入内存；
+    # 429 / 5xx 由 client 退避重试
+    result = client.chat_stream(lambda: DataURIJSONBody(file_path, mime, lambda uri: {**build_payload(uri), "stream": True}),
+                                label=label, on_delta=on_delta)
+    return result.content, result.finish_reason == "length"
+
 
-    data = resp.json()
-    return data["choices"][0]["message"]["content"]
+def ocr_file(file_path: str, client: OCRClient, cache: OCRCache | None = None,
+             on_delta: Callable[[str], None] | None = None) -> str:
+    """调用 GLM-OCR 整份识别文件，返回 Markdown 文本（命中缓存时直接返回）"""
+    with profiler.stage("cache_lookup"):
+        cache_key = cache.key(file_path, MODEL, PROMPT) if cache and cache.enabled else None
+        cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+
+    content, truncated = _recognize(file_path, client, on_delta=on_delta)
+    if truncated:
+        print(f"警告: 输出达到 max_tokens={MAX_TOKENS} 被截断: {file_path}", file=sys.stderr)
+    elif cache_key:
+        cache.put(cache_key, content, model=MODEL, source=Path(file_path).name)
+    return content
+
+
+def ocr_chunk(pdf_path: str, first: int, last: int, total: int, client: OCRClient,
+              cache: OCRCache | None, tmpdir: str, on_delta: Callable[[str], None] | None = None,
+              digest: str | None = None) -> str:
+    """识别一个页段；被截断且多于一页时抛出 TruncatedError，由调用方拆小重交
+
+    覆盖全部页的段直接提交原文件，缓存键与 ocr_file 相同。
+    其余页段的缓存键是原文件内容哈希加页码范围，与拆出的 PDF 字节无关。
+    digest 为原文件的 file_digest（由 ocr_pdf 算一次传入，不按段重复哈希整份 PDF）。
+    """
+    whole = first == 1 and last == total
+    prompt = PROMPT if whole else f"{PROMPT}\0pages {first}-{last}"
+    with profiler.stage("cache_lookup"):
+        cache_key = None
+        if cache and cache.enabled:
+            cache_key = cache.digest_key(digest or file_digest(pdf_path), MODEL, prompt)
+        cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+
+    path = pdf_path if whole else split_pdf(pdf_path, first, last, tmpdir)
+    try:
+        content, truncated = _recognize(path, client, f"第 {first}–{last}/{total} 页", on_delta)
+    finally:
+        if not whole:
+            os.unlink(path)
+    if truncated:
+        if last > first:
+            raise TruncatedError(f"第 {first}–{last} 页输出被截断")
+        # 单页也放不下：无法再拆，保留截断结果但不写缓存
+        print(f"  警告: 第 {first} 页单页输出仍超过 max_tokens={MAX_TOKENS}，结果不完整", file=sys.stderr)
+        return content
+    if cache_key:
+        cache.put(cache_key, content, model=MODEL, source=f"{Path(pdf_path).name} p{first}-{last}")
+    return content
+
+
+def ocr_pdf(pdf_path: str, total: int, client: OCRClient, cache: OCRCache | None = None,
+            workers: int = DEFAULT_WORKERS, pages_per_chunk: int | None = None,
+            writer: PageWriter | None = None) -> tuple[str, list[tuple[int, int]]]:
+    """按页段并发识别 PDF，按页序拼接。
+
+    被截断的页段对半拆开重新提交（只重做这一段）。
+    给出 writer 时各段边收边按页序写出，返回的文字为空串。
+    返回 (拼接后的文字, 最终失败的页段列表)；失败的页段以占位注释代替。
+    """
+    size = max(1, pages_per_chunk or default_pages_per_chunk())
+    with profiler.stage("cache_lookup"):
+        digest = file_digest(pdf_path) if cache and cache.enabled else None
+    results: dict[int, tuple[int, str]] = {}
+    failed: list[tuple[int, int]] = []
+
+    def finish(first, last, text):
+        if writer:
+            writer.finish(first, last, text)
+        else:
+            results[first] = (last, text)
+
+    with tempfile.TemporaryDirectory(prefix="glm-ocr-") as tmpdir, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        def submit(first, last):
+            on_delta = (lambda delta: writer.append(first, delta)) if writer else None
+            future = pool.submit(ocr_chunk, pdf_path, first, last, total, client, cache, tmpdir, on_delta, digest)
+            pending[future] = (first, last)
+
+        pending = {}
+        for first in range(1, total + 1, size):
+            submit(first, min(total, first + size - 1))
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                first, last = pending.pop(future)
+                try:
+                    finish(first, last, future.result())
+                    print(f"  第 {first}–{last}/{total} 页完成", file=sys.stderr)
+                except TruncatedError:
+                    if writer:
+                        writer.discard(first)
+                    mid = (first + last) // 2
+                    print(f"  第 {first}–{last} 页输出被截断，拆为 {first}–{mid} 与 {mid + 1}–{last} 重交",
+                          file=sys.stderr)
+                    submit(first, mid)
+                    submit(mid + 1, last)
+                except Exception as e:
+                    failed.append((first, last))
+                    finish(first, last, f"<!-- 第 {first}–{last} 页识别失败: {e} -->")
+                    print(f"  第 {first}–{last}/{total} 页最终失败: {e}", file=sys.stderr)
+    return "\n\n".join(text for _, (_, text) in sorted(results.items())), sorted(failed)
 
 
 def main():
     parser = argparse.ArgumentParser(description="GLM-OCR 文档识别")
     parser.add_argument("file", help="要识别的文件路径 (PDF/JPG/PNG)")
     parser.add_argument("--output", "-o", help="输出文件路径 (默认输出到 stdout)")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_WORKERS,
+                        help=f"PDF 页段并发请求数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--pages-per-chunk", type=int, default=None,
+                        help=f"每段页数 (默认按输出预算估算: {default_pages_per_chunk()})")
+    parser.add_argument("--no-cache", action="store_true", help="不读写 OCR 结果缓存，强制重新识别")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="记录各阶段耗时、调用次数与字节数：.json 结尾写 Chrome trace，否则写 JSON lines")
     args = parser.parse_args()
+    profiler.enable(args.profile)
 
     api_key = os.environ.get("BIGMODEL_API_KEY")
     if not api_key:
@@ -114,16 +239,36 @@ def main():
         print(f"错误: 文件不存在: {args.file}", file=sys.stderr)
         sys.exit(1)
 
-    print(f"正在识别: {args.file}...", file=sys.stderr)
-    result = ocr_file(args.file, api_key)
-
+    cache = OCRCache(enabled=not args.no_cache)
+    client = OCRClient(API_BASE, api_key, pool_size=max(1, args.workers))
+    failed = []
+    # 按页序边识别边写出，每段 fsync；不在内存里拼接全文
+    with PageWriter(args.output) as writer:
+        try:
+            if args.file.lower().endswith(".pdf"):
+                from ocr import pdf_page_count
+                total = pdf_page_count(args.file)
+                size = args.pages_per_chunk or default_pages_per_chunk()
+                print(f"正在识别: {args.file}（{total} 页，每段 {size} 页，{args.workers} 路并发）...", file=sys.stderr)
+                _, failed = ocr_pdf(args.file, total, client, cache, args.workers, size, writer)
+            else:
+                print(f"正在识别: {args.file}...", file=sys.stderr)
+                writer.finish(1, 1, ocr_file(args.file, client, cache, lambda delta: writer.append(1, delta)))
+        except OCRAPIError as e:
+            print(str(e), file=sys.stderr)
+            profiler.write()
+            sys.exit(1)
+    profiler.write()
+    print(client.stream_summary(), file=sys.stderr)
+    if cache.enabled:
+        print(cache.summary(), file=sys.stderr)
     if args.output:
-        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(result)
         print(f"结果已保存到: {args.output}", file=sys.stderr)
-    else:
-        print(result)
+
+    if failed:
+        ranges = ", ".join(f"{a}–{b}" for a, b in failed)
+        print(f"警告: 以下页段识别失败，已用占位注释代替: {ranges}", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
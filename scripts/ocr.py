@@ -1,21 +1,41 @@
 #!/usr/bin/env python3
 """
 OCR 文档识别脚本（通过 OpenRouter）
-用法: python3 scripts/ocr.py <文件路径> [--output 输出路径] [--model 模型名]
+用法: python3 scripts/ocr.py <文件路径> [--output 输出路径] [--model 模型名] [--workers N] [--rate R] [--no-cache] [--profile 路径]
+      [--no-text-layer] [--preprocess [--upload-budget-kb KB]]
+      [--two-tier [--tier1-dpi D] [--tier2-dpi D] [--tier2-model 模型] [--tier-report 路径]] [--hedge [--hedge-percentile P] [--hedge-after 秒]]
 
 支持: PDF（转图片）、JPG、PNG
-需要: OPENROUTER_API_KEY 环境变量
+文字层: PDF 先用 pdftotext 取各页自带文字，质量合格的页直接采用，只有扫描页/乱码页才送 OCR
+      （见 pdf_text_layer.py；--no-text-layer 关闭）
+需要: OPENROUTER_API_KEY 环境变量（OPENROUTER_API_BASE 可改 API 地址，如指向本地桩服务器）
+缓存: 已识别过的页面从 .cache/ocr/ 读取，不再调用 API（见 ocr_cache.py）
+输出: 流式（SSE）接收识别结果，按页序边收边写入输出文件，每写完一页 fsync；
+      中途崩溃时已完成的页都在文件里（见 ocr_output.py）。结束时打印首 token 延迟
+预处理: --preprocess 时按页面尺寸选 DPI，上传前转灰度/二值化并压缩到预算内（需要 Pillow，见 ocr_preprocess.py）
+两档: --two-tier 时先按低 DPI 识别全部页，本地给结果打分（字符类别、乱码、过短、复读），
+      只有不合格的页按高 DPI 重新渲染（可另换 --tier2-model）再识别，分档决定写入 --tier-report（见 ocr_quality.py）
+批量: 整个目录 / 通配符、可断点续跑的批量识别见 ocr_batch.py
+对冲: --hedge 时一页在主服务商（OpenRouter）迟迟不返回时补发给 BigModel glm-ocr，先成功者胜出，
+      结束时打印两家的延迟直方图（需要 BIGMODEL_API_KEY，见 ocr_hedge.py）
 
 示例:
   python3 scripts/ocr.py books/essay1/某文章.pdf --output output/result.md
   python3 scripts/ocr.py photo.jpg --model z-ai/glm-4.6v
+  python3 scripts/ocr.py books/essay1/整本书.pdf --workers 4 -o output/book.md
+  python3 scripts/ocr.py books/essay1/整本书.pdf --workers 4 --two-tier --tier-report output/book.tiers.jsonl -o output/book.md
+  python3 scripts/ocr.py books/essay1/整本书.pdf --workers 4 --hedge --hedge-percentile 0.9 -o output/book.md
 """
 
 import sys
 import os
-import json
-import base64
+import re
 import argparse
+import importlib
+import subprocess
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 
 try:
@@ -24,55 +44,222 @@ except ImportError:
     print("需要安装 requests: pip install requests", file=sys.stderr)
     sys.exit(1)
 
-API_BASE = "https://openrouter.ai/api/v1"
+from ocr_cache import OCRCache, file_digest
+from ocr_client import OCRClient, DEFAULT_RATE
+from ocr_hedge import HedgedOCR, Provider, DEFAULT_PERCENTILE, DEFAULT_HEDGE_AFTER
+from ocr_output import PageWriter
+from ocr_quality import TIER1_DPI, TIER2_DPI, QualityGate
+from ocr_preprocess import DEFAULT_BUDGET_KB, adaptive_dpi, page_sizes, preprocess_image, require_pillow
+from pdf_text_layer import has_pdftotext, usable_pages
+from ocr_payload import DataURIJSONBody, guess_mime
+from profiling import profiler
+
+API_BASE = os.environ.get("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
 DEFAULT_MODEL = "z-ai/glm-4.6v"
+DEFAULT_WORKERS = 1
+RENDER_DPI = 200
+RENDER_BATCH = 4
+PAGE_SEPARATOR = "\n\n---\n\n"
+PROMPT = "请识别这张图片中的所有文字，以 Markdown 格式输出。保持原文段落结构和标点符号。如果是表格，用 Markdown 表格格式。"
 
 
-def encode_image(file_path: str) -> str:
-    """将图片编码为 base64 data URI"""
-    path = Path(file_path)
-    suffix = path.suffix.lower()
-    mime_map = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
-    mime = mime_map.get(suffix, "image/png")
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
-
-
-def pdf_to_images(pdf_path: str) -> list[str]:
-    """将 PDF 每页转为 PNG 图片（需要 pdftoppm / poppler-utils）"""
-    import subprocess, tempfile
-    tmpdir = tempfile.mkdtemp()
-    subprocess.run(["pdftoppm", "-png", "-r", "200", pdf_path, f"{tmpdir}/page"], check=True)
-    pages = sorted(Path(tmpdir).glob("page-*.png"))
-    return [str(p) for p in pages]
-
-
-def ocr_image(image_path: str, api_key: str, model: str) -> str:
-    """调用视觉模型识别图片内容"""
-    data_uri = encode_image(image_path)
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload = {
+def build_payload(model: str, data_uri: str) -> dict:
+    """构造 chat/completions 请求体"""
+    return {
         "model": model,
         "messages": [
             {
                 "role": "user",
                 "content": [
                     {"type": "image_url", "image_url": {"url": data_uri}},
-                    {"type": "text", "text": "请识别这张图片中的所有文字，以 Markdown 格式输出。保持原文段落结构和标点符号。如果是表格，用 Markdown 表格格式。"}
+                    {"type": "text", "text": PROMPT}
                 ]
             }
         ],
         "max_tokens": 4096,
     }
-    resp = requests.post(f"{API_BASE}/chat/completions", headers=headers, json=payload, timeout=120)
-    if resp.status_code != 200:
-        print(f"API 错误 ({resp.status_code}): {resp.text}", file=sys.stderr)
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    """读取 PDF 页数（需要 pdfinfo / poppler-utils）"""
+    out = subprocess.run(["pdfinfo", pdf_path], check=True, capture_output=True, text=True).stdout
+    m = re.search(r"^Pages:\s+(\d+)", out, re.MULTILINE)
+    if not m:
+        raise RuntimeError(f"无法读取 PDF 页数: {pdf_path}")
+    return int(m.group(1))
+
+
+def page_number(image_path: str) -> int:
+    """pdftoppm 输出文件名 page-07.png / hi-7.png 中的页码"""
+    return int(Path(image_path).stem.rsplit("-", 1)[1])
+
+
+def render_page(pdf_path: str, page: int, dpi: int, out_dir: str) -> str:
+    """单独把一页渲染成 out_dir/hi-<页码>.png（二档重识别用），返回路径"""
+    prefix = f"{out_dir}/hi-{page}"
+    with profiler.stage("render"):
+        subprocess.run(["pdftoppm", "-png", "-singlefile", "-r", str(dpi), "-f", str(page), "-l", str(page),
+                        pdf_path, prefix], check=True)
+    return f"{prefix}.png"
+
+
+def iter_pdf_pages(pdf_path: str, total: int, out_dir: str, dpi: int | dict[int, int] = RENDER_DPI,
+                   batch: int = RENDER_BATCH, only: Iterable[int] | None = None) -> Iterator[tuple[int, str]]:
+    """按页段惰性渲染 PDF 到 out_dir，逐页产出 (页码, PNG 路径)（需要 pdftoppm / poppler-utils）
+
+    每次只渲染 batch 页，下一段在消费方取完本段后才开始渲染；
+    配合 ocr_pages(cleanup=True) 逐页删除，磁盘占用与总页数无关。
+    dpi 可以是 {页码: DPI}（--preprocess 的自适应 DPI）；only 给出时只渲染这些页
+    （文字层不可用的页）。段内页码连续且 DPI 相同的页一起交给一次 pdftoppm。
+    """
+    page_dpi = (lambda i: dpi.get(i, RENDER_DPI)) if isinstance(dpi, dict) else (lambda i: dpi)
+    wanted = sorted(only) if only is not None else list(range(1, total + 1))
+    for k in range(0, len(wanted), batch):
+        chunk = wanted[k:k + batch]
+        run_start = chunk[0]
+        for j, i in enumerate(chunk):
+            nxt = chunk[j + 1] if j + 1 < len(chunk) else None
+            if nxt == i + 1 and page_dpi(nxt) == page_dpi(run_start):
+                continue
+            with profiler.stage("render", items=i - run_start + 1):
+                subprocess.run(
+                    ["pdftoppm", "-png", "-r", str(page_dpi(run_start)), "-f", str(run_start), "-l", str(i),
+                     pdf_path, f"{out_dir}/page"],
+                    check=True,
+                )
+            run_start = nxt
+        # pdftoppm 按总页数补零（page-07.png / page-007.png），按数字取本段的页
+        rendered = {page_number(p): p for p in Path(out_dir).glob("page-*.png")}
+        for i in chunk:
+            if i in rendered:
+                yield i, str(rendered[i])
+
+
+def with_preprocess(recognize: Callable[..., str], budget: int) -> Callable[..., str]:
+    """在 recognize 之前先压缩页面图片（ocr_preprocess.py），上传后删除压缩件"""
+    def run(image_path: str, label: str, on_delta: Callable[[str], None] | None = None) -> str:
+        with profiler.stage("preprocess"):
+            pre = preprocess_image(image_path, budget)
+        profiler.add_bytes("preprocess", pre.original_bytes)
+        try:
+            return recognize(pre.path, label, on_delta)
+        finally:
+            if pre.path != image_path:
+                Path(pre.path).unlink(missing_ok=True)
+    return run
+
+
+def ocr_image(image_path: str, client: OCRClient, model: str, cache: OCRCache | None = None,
+              label: str = "", on_delta: Callable[[str], None] | None = None) -> str:
+    """调用视觉模型识别图片内容（命中缓存时直接返回）
+
+    结果以 SSE 流式接收，每到一段文字调用 on_delta。
+    429 / 5xx / 网络错误由 client 对这一页单独退避重试，用尽后抛出 OCRAPIError。
+    """
+    with profiler.stage("cache_lookup"):
+        cache_key = cache.key(image_path, model, PROMPT) if cache and cache.enabled else None
+        cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+    mime = guess_mime(image_path, default="image/png")
+    # 请求体从 mmap 流式编码，不在内存中拼出完整的 base64 字符串
+    result = client.chat_stream(
+        lambda: DataURIJSONBody(image_path, mime, lambda data_uri: {**build_payload(model, data_uri), "stream": True}),
+        label=label, on_delta=on_delta)
+    content = result.content
+    if cache_key:
+        cache.put(cache_key, content, model=model, source=Path(image_path).name)
+    return content
+
+
+def ocr_image_hedged(image_path: str, hedge: HedgedOCR, cache: OCRCache | None = None, label: str = "",
+                     on_delta: Callable[[str], None] | None = None) -> str:
+    """对冲版 ocr_image：任一服务商的缓存结果都可直接用，新结果按胜出者的模型和提示词缓存
+
+    两家的请求同时在途、谁先完成不定，不做流式回调（on_delta 不会被调用），整页完成后一次写出。
+    """
+    use_cache = cache is not None and cache.enabled
+    keys = {}
+    with profiler.stage("cache_lookup"):
+        digest = file_digest(image_path) if use_cache else None
+        for p in hedge.providers if use_cache else ():
+            keys[p.name] = cache.digest_key(digest, p.model, p.prompt)
+            cached = cache.get(keys[p.name])
+            if cached is not None:
+                return cached
+    content, winner = hedge.recognize(image_path, label)
+    if use_cache:
+        cache.put(keys[winner.name], content, model=winner.model, source=Path(image_path).name)
+    return content
+
+
+def make_hedge(args, api_key: str) -> HedgedOCR:
+    """主服务商为本脚本的 OpenRouter 模型，备用为 glm-ocr.py 的 BigModel glm-ocr"""
+    glm = importlib.import_module("glm-ocr")
+    bigmodel_key = os.environ.get("BIGMODEL_API_KEY")
+    if not bigmodel_key:
+        print("错误: --hedge 需要设置 BIGMODEL_API_KEY 环境变量", file=sys.stderr)
         sys.exit(1)
-    return resp.json()["choices"][0]["message"]["content"]
+    pool = max(1, args.workers)
+    primary = Provider("openrouter",
+                       OCRClient(API_BASE, api_key, rate=args.rate, burst=pool, pool_size=pool),
+                       args.model, PROMPT, lambda data_uri: build_payload(args.model, data_uri))
+    backup = Provider("bigmodel", OCRClient(glm.API_BASE, bigmodel_key, rate=args.rate, burst=pool, pool_size=pool),
+                      glm.MODEL, glm.PROMPT, glm.build_payload)
+    return HedgedOCR([primary, backup], percentile=args.hedge_percentile, hedge_after=args.hedge_after,
+                     max_in_flight=pool)
+
+
+def ocr_pages(pages: Iterable[tuple[int, str]], total: int, recognize: Callable[..., str],
+              workers: int = DEFAULT_WORKERS, cleanup: bool = False,
+              writer: PageWriter | None = None) -> tuple[list[str], list[int]]:
+    """并发识别多页，结果按页码顺序返回。
+
+    recognize(图片路径, 标签, on_delta) 识别一页，即绑定好客户端与缓存的 ocr_image / ocr_image_hedged。
+    pages 可以是惰性生成器：同时在途的页数不超过 2×workers，渲染与识别重叠。
+    cleanup=True 时每页结果落定后立即删除其图片。
+    给出 writer 时各页的流式文字与最终结果交给它按页序写出，results 中不再保留页文字。
+    返回 (results, failed)：failed 为重试后仍失败的页码（从 1 开始），
+    对应位置写入占位注释，其余页照常输出。
+    """
+    results: list[str] = [""] * total
+    failed: list[int] = []
+    workers = max(1, workers)
+    page_iter = iter(pages)
+    pending = {}
+    done = 0
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * workers:
+                try:
+                    i, page = next(page_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                on_delta = (lambda delta, i=i: writer.append(i, delta)) if writer else None
+                future = pool.submit(recognize, page, f"第 {i}/{total} 页", on_delta)
+                pending[future] = (i, page)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i, page = pending.pop(future)
+                done += 1
+                try:
+                    text = future.result()
+                    print(f"  第 {i}/{total} 页完成 ({done}/{total})", file=sys.stderr)
+                except Exception as e:
+                    failed.append(i)
+                    text = f"<!-- 第 {i} 页识别失败: {e} -->"
+                    print(f"  第 {i}/{total} 页最终失败: {e}", file=sys.stderr)
+                if writer:
+                    writer.finish(i, i, text)
+                else:
+                    results[i - 1] = text
+                if cleanup:
+                    Path(page).unlink(missing_ok=True)
+    return results, sorted(failed)
 
 
 def main():
@@ -80,7 +267,33 @@ def main():
     parser.add_argument("file", help="要识别的文件路径 (PDF/JPG/PNG)")
     parser.add_argument("--output", "-o", help="输出文件路径 (默认 stdout)")
     parser.add_argument("--model", "-m", default=DEFAULT_MODEL, help=f"模型名 (默认 {DEFAULT_MODEL})")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_WORKERS,
+                        help=f"PDF 并发识别页数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"每秒最多发起的请求数，遇 429 自动降速 (默认 {DEFAULT_RATE}，0 为不限)")
+    parser.add_argument("--no-cache", action="store_true", help="不读写 OCR 结果缓存，强制重新识别")
+    parser.add_argument("--no-text-layer", dest="text_layer", action="store_false",
+                        help="不使用 PDF 自带的文字层，所有页都渲染后送 OCR")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="按页面尺寸自适应 DPI，上传前转灰度/二值化并压缩到字节预算内（需要 Pillow）")
+    parser.add_argument("--upload-budget-kb", type=int, default=DEFAULT_BUDGET_KB,
+                        help=f"--preprocess 时每页上传字节预算，KB (默认 {DEFAULT_BUDGET_KB})")
+    parser.add_argument("--two-tier", action="store_true",
+                        help="先低 DPI 识别，本地打分不合格的页再高 DPI（或换模型）重新识别")
+    parser.add_argument("--tier1-dpi", type=int, default=TIER1_DPI, help=f"一档渲染 DPI (默认 {TIER1_DPI})")
+    parser.add_argument("--tier2-dpi", type=int, default=TIER2_DPI, help=f"二档渲染 DPI (默认 {TIER2_DPI})")
+    parser.add_argument("--tier2-model", help="二档使用的模型 (默认与 --model 相同)")
+    parser.add_argument("--tier-report", metavar="PATH", help="--two-tier 时把每页的分档决定写成 JSON lines")
+    parser.add_argument("--hedge", action="store_true",
+                        help="主服务商超过延迟阈值未返回时，向 BigModel glm-ocr 补发同一页，先成功者胜出")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_PERCENTILE,
+                        help=f"对冲阈值取主服务商延迟的哪个分位 (默认 {DEFAULT_PERCENTILE})")
+    parser.add_argument("--hedge-after", type=float, default=DEFAULT_HEDGE_AFTER,
+                        help=f"延迟样本不足时的对冲阈值，秒 (默认 {DEFAULT_HEDGE_AFTER:g})")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="记录各阶段耗时、调用次数与字节数：.json 结尾写 Chrome trace，否则写 JSON lines")
     args = parser.parse_args()
+    profiler.enable(args.profile)
 
     api_key = os.environ.get("OPENROUTER_API_KEY")
     if not api_key:
@@ -92,27 +305,91 @@ def main():
         sys.exit(1)
 
     suffix = Path(args.file).suffix.lower()
-    results = []
+    failed: list[int] = []
+    cache = OCRCache(enabled=not args.no_cache)
+    if args.hedge:
+        hedge = make_hedge(args, api_key)
+        recognize = lambda path, label, on_delta=None: ocr_image_hedged(path, hedge, cache, label, on_delta)
+    else:
+        client = OCRClient(API_BASE, api_key, rate=args.rate, burst=max(1, args.workers), pool_size=args.workers)
+        recognize = lambda path, label, on_delta=None: ocr_image(path, client, args.model, cache, label, on_delta)
+    if args.preprocess:
+        require_pillow()
+        recognize = with_preprocess(recognize, args.upload_budget_kb * 1024)
+    gate = None
+    if args.two_tier:
+        # 二档不经过 --preprocess 压缩，否则高 DPI 图又会被缩回预算内
+        tier2_client = OCRClient(API_BASE, api_key, rate=args.rate, burst=max(1, args.workers),
+                                 pool_size=args.workers) if args.hedge else client
+        tier2_model = args.tier2_model or args.model
+        recognize1 = recognize
+        recognize2 = lambda path, label, on_delta=None: ocr_image(path, tier2_client, tier2_model, cache, label, on_delta)
+
+        def make_gate(rerender, dpi1, dpi2):
+            return QualityGate(recognize1, recognize2, rerender, page_number if rerender else (lambda path: 1),
+                               tier1=(args.model, dpi1), tier2=(tier2_model, dpi2))
 
+    # 各页按页序边识别边写出，每页 fsync；不在内存里拼接全文
+    writer = PageWriter(args.output, separator=PAGE_SEPARATOR)
     if suffix == ".pdf":
-        pages = pdf_to_images(args.file)
-        print(f"PDF 共 {len(pages)} 页，逐页识别中...", file=sys.stderr)
-        for i, page in enumerate(pages, 1):
-            print(f"  第 {i}/{len(pages)} 页...", file=sys.stderr)
-            results.append(ocr_image(page, api_key, args.model))
+        total = pdf_page_count(args.file)
+        dpi = RENDER_DPI
+        if args.two_tier:
+            dpi = args.tier1_dpi
+        elif args.preprocess:
+            dpi = {i: adaptive_dpi(*size) for i, size in page_sizes(args.file, total).items()}
+        with writer, tempfile.TemporaryDirectory(prefix="ocr-pages-") as tmpdir:
+            if args.two_tier:
+                gate = make_gate(lambda path: render_page(args.file, page_number(path), args.tier2_dpi, tmpdir),
+                                 args.tier1_dpi, args.tier2_dpi)
+                recognize = gate.recognize
+            texts = {}
+            if args.text_layer and has_pdftotext():
+                with profiler.stage("text_layer", items=total):
+                    texts, _ = usable_pages(args.file, total, tmpdir)
+                print(f"文字层: {len(texts)}/{total} 页质量合格，直接采用", file=sys.stderr)
+            elif args.text_layer:
+                print("未找到 pdftotext，跳过文字层检查，全部页面送 OCR", file=sys.stderr)
+            for i, text in texts.items():
+                writer.finish(i, i, text)
+                if gate:
+                    gate.record_external(i, "text-layer", len(text))
+            need = [i for i in range(1, total + 1) if i not in texts]
+            print(f"PDF 共 {total} 页，{len(need)} 页边渲染边识别（{args.workers} 路并发）...", file=sys.stderr)
+            pages = iter_pdf_pages(args.file, total, tmpdir, dpi, only=need)
+            _, failed = ocr_pages(pages, total, recognize, args.workers, cleanup=True, writer=writer)
     else:
         print(f"正在识别: {args.file}...", file=sys.stderr)
-        results.append(ocr_image(args.file, api_key, args.model))
-
-    output = "\n\n---\n\n".join(results)
+        if args.two_tier:
+            # 单张图片无法重新渲染，二档只换模型
+            gate = make_gate(None, None, None)
+            recognize = gate.recognize
+        with writer:
+            try:
+                writer.finish(1, 1, recognize(args.file, "", lambda delta: writer.append(1, delta)))
+            except Exception as e:
+                print(f"识别失败: {e}", file=sys.stderr)
+                profiler.write()
+                sys.exit(1)
 
+    profiler.write()
+    if args.hedge:
+        print(hedge.report(), file=sys.stderr)
+    else:
+        print(client.stream_summary(), file=sys.stderr)
+    if gate:
+        print(gate.summary(), file=sys.stderr)
+        if args.tier_report:
+            gate.write_report(args.tier_report)
+            print(f"分档报告: {args.tier_report}", file=sys.stderr)
+    if cache.enabled:
+        print(cache.summary(), file=sys.stderr)
     if args.output:
-        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(output)
         print(f"结果已保存到: {args.output}", file=sys.stderr)
-    else:
-        print(output)
+
+    if failed:
+        print(f"警告: 以下页识别失败，已用占位注释代替: {', '.join(map(str, failed))}", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+目录级批量 OCR，可断点续跑（复用 ocr.py 的渲染、识别与文字层）
+用法: python3 scripts/ocr_batch.py <目录或通配符>... [--output-dir 目录] [--workers N] [--files N]
+      [--model 模型名] [--rate R] [--journal 路径] [--no-cache] [--no-text-layer]
+
+- 目录递归查找 PDF / JPG / PNG；通配符支持 **（记得加引号，交给脚本展开）
+- 多个文件同时处理（--files），所有文件的识别请求共享一个全局并发上限（--workers）
+- 每识别完一页、每写完一个文件，都向只追加的日志（JSON lines，逐条 fsync）记一笔。
+  崩溃或 Ctrl-C 后重跑同一命令：已完成的文件跳过，未完成文件里已记录的页不再渲染和识别
+- 日志按「文件内容 sha256 + 模型」记账，文件改名或移动不影响续跑，内容变了则重新识别
+- 结果默认写在源文件旁，保留原扩展名再加 .md（scan.pdf → scan.pdf.md，scan.png → scan.png.md，
+  同一目录的同名 PDF / 图片不会互相覆盖），页与页之间用 --- 分隔，与 ocr.py 输出一致；
+  先写临时文件再改名，不会留下半截的 .md
+
+需要: OPENROUTER_API_KEY 环境变量，PDF 需要 pdfinfo / pdftoppm（poppler-utils）
+
+示例:
+  python3 scripts/ocr_batch.py books/essay1 --workers 4
+  python3 scripts/ocr_batch.py 'books/**/*.pdf' --output-dir output/ocr --files 3 --workers 6
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from ocr import (API_BASE, DEFAULT_MODEL, PAGE_SEPARATOR, iter_pdf_pages, ocr_image, ocr_pages,
+                 page_number, pdf_page_count)
+from ocr_cache import OCRCache, file_digest
+from ocr_client import OCRClient, DEFAULT_RATE
+from pdf_text_layer import has_pdftotext, usable_pages
+
+SUFFIXES = (".pdf", ".jpg", ".jpeg", ".png")
+DEFAULT_WORKERS = 4
+DEFAULT_FILES = 2
+DEFAULT_JOURNAL = Path(__file__).resolve().parent.parent / ".cache" / "ocr-journal.jsonl"
+
+
+class Journal:
+    """只追加的进度日志：每条记录一行 JSON，写完即 fsync
+
+    读取时跳过无法解析的行（崩溃时写了一半的最后一行）。
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.pages: dict[str, dict[int, str]] = {}
+        self.files: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("type") == "page":
+                        self.pages.setdefault(rec["key"], {})[rec["page"]] = rec["text"]
+                    elif rec.get("type") == "file":
+                        self.files[rec["key"]] = rec
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _append(self, rec: dict) -> None:
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def page(self, key: str, source: str, page: int, text: str) -> None:
+        with self._lock:
+            self.pages.setdefault(key, {})[page] = text
+        self._append({"type": "page", "key": key, "file": source, "page": page, "text": text})
+
+    def file(self, key: str, source: str, output: str, pages: int) -> None:
+        rec = {"type": "file", "key": key, "file": source, "output": output, "pages": pages}
+        with self._lock:
+            self.files[key] = rec
+        self._append(rec)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def collect(inputs: list[str]) -> list[tuple[Path, Path]]:
+    """展开目录与通配符，返回 [(源文件, 相对输出路径)]，按路径排序、去重"""
+    found: dict[Path, Path] = {}
+    for arg in inputs:
+        if os.path.isdir(arg):
+            for p in sorted(Path(arg).rglob("*")):
+                if p.is_file() and p.suffix.lower() in SUFFIXES:
+                    found.setdefault(p.resolve(), p.relative_to(arg))
+        else:
+            matches = glob.glob(arg, recursive=True) if glob.has_magic(arg) else [arg]
+            for m in sorted(matches):
+                p = Path(m)
+                if p.is_file() and p.suffix.lower() in SUFFIXES:
+                    found.setdefault(p.resolve(), Path(p.name))
+    return sorted(found.items())
+
+
+def output_path(source: Path, rel: Path, output_dir: str | None) -> Path:
+    """结果路径：保留源文件扩展名再加 .md，免得 scan.pdf / scan.png 写到同一个 scan.md"""
+    base = Path(output_dir) / rel if output_dir else source
+    return base.with_name(base.name + ".md")
+
+
+def colliding_outputs(jobs: list[tuple[Path, Path]]) -> dict[Path, list[Path]]:
+    """多个源文件映射到同一输出路径的情况（如通配符匹配到不同目录下的同名文件）"""
+    by_output: dict[Path, list[Path]] = {}
+    for src, out in jobs:
+        by_output.setdefault(out.resolve(), []).append(src)
+    return {out: srcs for out, srcs in by_output.items() if len(srcs) > 1}
+
+
+class BatchOCR:
+    """批量识别：files 个文件并行，所有页请求共用 workers 个并发名额"""
+
+    def __init__(self, client: OCRClient, model: str, cache: OCRCache, journal: Journal,
+                 workers: int, text_layer: bool):
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.text_layer = text_layer and has_pdftotext()
+        self.slots = threading.BoundedSemaphore(self.workers)
+
+    def key(self, source: Path) -> str:
+        return f"{file_digest(str(source))}:{self.model}"
+
+    def recognize(self, key: str, name: str, page_of=page_number):
+        """绑定到某个文件的 recognize：占用全局名额识别一页，成功后记入日志"""
+        def run(image_path: str, label: str, on_delta=None) -> str:
+            with self.slots:
+                text = ocr_image(image_path, self.client, self.model, self.cache, f"{name} {label}".strip())
+            self.journal.page(key, name, page_of(image_path), text)
+            return text
+        return run
+
+    def process(self, source: Path, output: Path) -> list[int]:
+        """识别一个文件并写出结果，返回失败的页码；已完成的文件直接跳过"""
+        key = self.key(source)
+        name = str(source)
+        done = self.journal.files.get(key)
+        if done and Path(done["output"]) == output and output.exists():
+            print(f"跳过（已完成）: {name}", file=sys.stderr)
+            return []
+        known = dict(self.journal.pages.get(key, {}))
+        failed: list[int] = []
+        if source.suffix.lower() == ".pdf":
+            total = pdf_page_count(name)
+            with tempfile.TemporaryDirectory(prefix="ocr-batch-") as tmpdir:
+                texts = {}
+                if self.text_layer:
+                    texts, _ = usable_pages(name, total, tmpdir)
+                need = [i for i in range(1, total + 1) if i not in texts and i not in known]
+                print(f"{name}: {total} 页，文字层 {len(texts)} 页，日志中已有 {len(known)} 页，待识别 {len(need)} 页",
+                      file=sys.stderr)
+                if need:
+                    pages = iter_pdf_pages(name, total, tmpdir, only=need)
+                    results, failed = ocr_pages(pages, total, self.recognize(key, name), self.workers, cleanup=True)
+                    known.update({i: results[i - 1] for i in need})
+                known.update(texts)
+        else:
+            total = 1
+            if 1 not in known:
+                print(f"{name}: 图片，待识别", file=sys.stderr)
+                try:
+                    known[1] = self.recognize(key, name, lambda path: 1)(name, "")
+                except Exception as e:
+                    failed = [1]
+                    known[1] = f"<!-- 第 1 页识别失败: {e} -->"
+                    print(f"  {name} 识别失败: {e}", file=sys.stderr)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp = output.with_name(output.name + ".part")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(PAGE_SEPARATOR.join(known[i] for i in range(1, total + 1)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, output)
+        if not failed:
+            self.journal.file(key, name, str(output), total)
+        print(f"完成: {name} → {output}" + (f"（失败页: {', '.join(map(str, failed))}）" if failed else ""),
+              file=sys.stderr)
+        return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录级批量 OCR（OpenRouter），可断点续跑")
+    parser.add_argument("inputs", nargs="+", help="目录、文件或通配符（如 'books/**/*.pdf'）")
+    parser.add_argument("--output-dir", help="结果目录，保持输入目录下的相对路径 (默认写在源文件旁)")
+    parser.add_argument("--model", "-m", default=DEFAULT_MODEL, help=f"模型名 (默认 {DEFAULT_MODEL})")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_WORKERS,
+                        help=f"全局并发识别请求数上限 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES,
+                        help=f"同时处理的文件数 (默认 {DEFAULT_FILES})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"每秒最多发起的请求数，遇 429 自动降速 (默认 {DEFAULT_RATE}，0 为不限)")
+    parser.add_argument("--journal", default=str(DEFAULT_JOURNAL),
+                        help="进度日志路径 (默认 .cache/ocr-journal.jsonl)")
+    parser.add_argument("--no-cache", action="store_true", help="不读写 OCR 结果缓存")
+    parser.add_argument("--no-text-layer", dest="text_layer", action="store_false",
+                        help="不使用 PDF 自带的文字层，所有页都送 OCR")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENROUTER_API_KEY")
+    if not api_key:
+        print("错误: 请设置 OPENROUTER_API_KEY 环境变量", file=sys.stderr)
+        sys.exit(1)
+
+    sources = collect(args.inputs)
+    if not sources:
+        print("错误: 没有找到 PDF / JPG / PNG 文件", file=sys.stderr)
+        sys.exit(1)
+    jobs = [(src, output_path(src, rel, args.output_dir)) for src, rel in sources]
+    clashes = colliding_outputs(jobs)
+    if clashes:
+        print("错误: 以下文件会写到同一个输出，请分开处理或换 --output-dir:", file=sys.stderr)
+        for out, srcs in clashes.items():
+            print(f"  {out} ← {', '.join(map(str, srcs))}", file=sys.stderr)
+        sys.exit(1)
+
+    journal = Journal(args.journal)
+    client = OCRClient(API_BASE, api_key, rate=args.rate, burst=max(1, args.workers), pool_size=args.workers)
+    batch = BatchOCR(client, args.model, OCRCache(enabled=not args.no_cache), journal,
+                     args.workers, args.text_layer)
+    print(f"共 {len(jobs)} 个文件，{args.files} 个文件并行，全局 {args.workers} 路并发；日志: {args.journal}",
+          file=sys.stderr)
+
+    failed_files = []
+    pool = ThreadPoolExecutor(max_workers=max(1, args.files))
+    try:
+        pending = {pool.submit(batch.process, src, out): src for src, out in jobs}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                src = pending.pop(future)
+                try:
+                    if future.result():
+                        failed_files.append(src)
+                except Exception as e:
+                    failed_files.append(src)
+                    print(f"失败: {src}: {e}", file=sys.stderr)
+    except KeyboardInterrupt:
+        # 已完成的页都已 fsync 进日志；不等在途请求，直接退出
+        print(f"\n已中断。已完成的页已记入 {args.journal}，重新运行同一命令即可续跑", file=sys.stderr)
+        os._exit(130)
+    pool.shutdown()
+    journal.close()
+
+    print(client.stream_summary(), file=sys.stderr)
+    if failed_files:
+        print(f"警告: {len(failed_files)} 个文件有页识别失败，重新运行同一命令只会重试失败的页:", file=sys.stderr)
+        for src in failed_files:
+            print(f"  {src}", file=sys.stderr)
+        sys.exit(1)
+    print(f"全部完成: {len(jobs)} 个文件", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
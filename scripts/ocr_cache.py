@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+OCR 结果缓存（内容寻址，ocr.py 与 glm-ocr.py 共用）
+
+缓存键 = sha256(文件字节) + 模型名 + 提示词，任何一项变化都会重新识别。
+结果以 JSON 存放在 .cache/ocr/ 下（可用 OCR_CACHE_DIR 覆盖），
+总大小超过上限时按最近使用时间淘汰最旧的条目。
+
+用法:
+  from ocr_cache import OCRCache
+  cache = OCRCache()                 # 或 OCRCache(enabled=False) 对应 --no-cache
+  key = cache.key(path, model, prompt)
+  # 同一文件要算多个键时（多页段、多个服务商），文件只哈希一次:
+  digest = file_digest(path)
+  key = cache.digest_key(digest, model, prompt)
+  text = cache.get(key)
+  if text is None:
+      text = ...
+      cache.put(key, text)
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "ocr"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(file_path: str) -> str:
+    """分块计算文件 sha256，不把整个文件读入内存"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class OCRCache:
+    """磁盘 OCR 结果缓存，线程安全，按总大小做 LRU 淘汰"""
+
+    def __init__(self, cache_dir: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.enabled = enabled
+        self.dir = Path(cache_dir or os.environ.get("OCR_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = 0
+        if self.enabled:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._size = sum(p.stat().st_size for p in self._entries())
+
+    def key(self, file_path: str, model: str, prompt: str) -> str:
+        return self.digest_key(file_digest(file_path), model, prompt)
+
+    def digest_key(self, digest: str, model: str, prompt: str) -> str:
+        """由已算好的 file_digest 得到缓存键，与 key() 的结果相同"""
+        h = hashlib.sha256()
+        h.update(digest.encode())
+        h.update(b"\0" + model.encode("utf-8"))
+        h.update(b"\0" + prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        return self.dir.glob("*/*.json")
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = json.load(f)["content"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # 命中即刷新 mtime，淘汰时据此判断最近使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, content: str, **meta) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"content": content, **meta}, ensure_ascii=False).encode("utf-8")
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        old_size = path.stat().st_size if path.exists() else 0
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._size += len(data) - old_size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """删除最久未用的条目，直到总大小回到上限的 90% 以下；返回删除条数"""
+        with self._lock:
+            entries = []
+            for p in self._entries():
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, p in entries:
+                if total <= target:
+                    break
+                try:
+                    p.unlink()
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._size = total
+            return removed
+
+    def summary(self) -> str:
+        return f"缓存命中 {self.hits}，未命中 {self.misses}（{self.dir}）"
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+OCR HTTP 客户端层（ocr.py 与 glm-ocr.py 共用）
+
+- 复用连接池的 requests.Session：同一主机只握手一次，keep-alive 复用 TCP/TLS
+- 令牌桶限速：遇到 429 自动降速，连续成功后逐步恢复
+- 429 / 5xx / 连接错误按指数退避 + 抖动重试，优先遵守服务端 Retry-After
+- chat_stream()：SSE 流式响应，逐段回调增量文字，并统计首 token 延迟（TTFT）
+
+API 地址可用环境变量覆盖（OPENROUTER_API_BASE / BIGMODEL_API_BASE），
+便于对着本地桩服务器（如 http://127.0.0.1:8765）测试。
+
+用法:
+  client = OCRClient(API_BASE, api_key, rate=2.0)
+  data = client.chat(lambda: DataURIJSONBody(...))   # 每次尝试新建请求体
+  result = client.chat_stream(lambda: DataURIJSONBody(...), on_delta=print)   # 请求体需含 "stream": true
+  print(client.stream_summary())
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import profiler
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_RATE = 2.0
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+
+
+class OCRAPIError(RuntimeError):
+    """API 返回不可重试的错误，或重试次数用尽"""
+
+    def __init__(self, status: int | None, message: str):
+        super().__init__(f"API 错误 ({status}): {message}" if status else message)
+        self.status = status
+
+
+class TokenBucket:
+    """线程安全的令牌桶；rate 为每秒补充的令牌数，burst 为桶容量
+
+    penalize() 在收到 429 时把速率减半，reward() 在成功后缓慢加回，
+    最多恢复到初始速率（AIMD）。rate <= 0 表示不限速。
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.max_rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def reward(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+@dataclass
+class StreamResult:
+    """一次流式响应：完整文字、结束原因、首 token 延迟与总耗时（秒，从成功那次请求发出算起，不含排队与重试退避）"""
+    content: str
+    finish_reason: str | None
+    ttft: float | None
+    elapsed: float
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """解析 Retry-After（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class OCRClient:
+    """带连接池、限速和重试的 chat/completions 客户端，可在多线程间共享"""
+
+    def __init__(self, api_base: str, api_key: str, rate: float = DEFAULT_RATE, burst: float | None = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, pool_size: int = 8):
+        self.api_base = api_base.rstrip("/")
+        self.max_attempts = max(1, max_attempts)
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        self.ttfts: list[float] = []
+        self.stream_times: list[float] = []
+        self._stats_lock = threading.Lock()
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return min(BACKOFF_MAX, retry_after) + random.uniform(0, BACKOFF_BASE)
+        # full jitter：在 [0, base·2^n] 内均匀取值，避免多线程同时重试
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def post(self, path: str, make_body: Callable[[], object], label: str = "", **kwargs) -> requests.Response:
+        """发送 POST，失败时按策略重试；返回 200 响应，否则抛出 OCRAPIError
+
+        make_body 每次尝试都会被调用，因为流式请求体只能发送一次。
+        返回的响应带 sent_at：成功那次尝试开始发送的 time.monotonic()，
+        不含限速等待和重试退避，供计算首 token 延迟。
+        """
+        url = f"{self.api_base}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        prefix = f"{label} " if label else ""
+        for attempt in range(1, self.max_attempts + 1):
+            self.bucket.acquire()
+            body = make_body()
+            retry_after = None
+            try:
+                # 请求体是流式的，base64 编码在发送过程中进行，会单独计入 encode 阶段
+                with profiler.stage("http_roundtrip", bytes=len(body) if hasattr(body, "__len__") else 0):
+                    sent_at = time.monotonic()
+                    resp = self.session.post(url, data=body, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = OCRAPIError(None, f"网络错误: {e}")
+            else:
+                if resp.status_code == 200:
+                    self.bucket.reward()
+                    resp.sent_at = sent_at
+                    return resp
+                error = OCRAPIError(resp.status_code, resp.text[:500])
+                if resp.status_code not in RETRY_STATUSES:
+                    raise error
+                if resp.status_code == 429:
+                    self.bucket.penalize()
+                retry_after = retry_after_seconds(resp.headers.get("Retry-After"))
+            finally:
+                close = getattr(body, "close", None)
+                if close:
+                    close()
+            if attempt == self.max_attempts:
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            print(f"  {prefix}{error}，{delay:.1f}s 后重试 ({attempt}/{self.max_attempts})...", file=sys.stderr)
+            time.sleep(delay)
+
+    def chat(self, make_body: Callable[[], object], label: str = "", **kwargs) -> dict:
+        """调用 chat/completions，返回解析后的 JSON"""
+        resp = self.post("chat/completions", make_body, label, **kwargs)
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise OCRAPIError(resp.status_code, f"响应不是合法 JSON: {e}") from e
+
+    def chat_stream(self, make_body: Callable[[], object], label: str = "",
+                    on_delta: Callable[[str], None] | None = None, **kwargs) -> StreamResult:
+        """以 SSE 流式调用 chat/completions，每收到一段文字就调用 on_delta
+
+        请求体须带 "stream": true。建立连接前的错误照常重试；
+        读流途中断开时整次重发，已回调过的文字由调用方在收到最终结果后校正。
+        """
+        prefix = f"{label} " if label else ""
+        for attempt in range(1, self.max_attempts + 1):
+            resp = self.post("chat/completions", make_body, label, stream=True, **kwargs)
+            start = resp.sent_at    # 从成功那次发送算起，不计排队和重试退避
+            parts: list[str] = []
+            finish_reason = None
+            ttft = None
+            try:
+                with profiler.stage("stream_read"):
+                    for line in resp.iter_lines(chunk_size=None):
+                        if not line.startswith(b"data:"):
+                            continue    # 空行分隔事件；": keep-alive" 等注释行
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            break
+                        try:
+                            choice = json.loads(data)["choices"][0]
+                        except (ValueError, KeyError, IndexError) as e:
+                            raise OCRAPIError(resp.status_code, f"无法解析的流式数据: {data[:200]!r}") from e
+                        finish_reason = choice.get("finish_reason") or finish_reason
+                        delta = (choice.get("delta") or {}).get("content")
+                        if not delta:
+                            continue
+                        if ttft is None:
+                            ttft = time.monotonic() - start
+                        parts.append(delta)
+                        if on_delta:
+                            on_delta(delta)
+            except requests.RequestException as e:
+                if attempt == self.max_attempts:
+                    raise OCRAPIError(None, f"流式响应中断: {e}") from e
+                print(f"  {prefix}流式响应中断: {e}，重新请求 ({attempt}/{self.max_attempts})...", file=sys.stderr)
+                continue
+            finally:
+                resp.close()
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self.stream_times.append(elapsed)
+                if ttft is not None:
+                    self.ttfts.append(ttft)
+            return StreamResult("".join(parts), finish_reason, ttft, elapsed)
+
+    def stream_summary(self) -> str:
+        """流式请求的首 token 延迟与总耗时统计"""
+        with self._stats_lock:
+            ttfts, times = list(self.ttfts), list(self.stream_times)
+        if not times:
+            return "流式响应: 无"
+        line = f"流式响应 {len(times)} 次，总耗时 p50 {_quantile(times, 0.5):.2f}s / p90 {_quantile(times, 0.9):.2f}s"
+        if ttfts:
+            line += (f"；首 token p50 {_quantile(ttfts, 0.5):.2f}s / p90 {_quantile(ttfts, 0.9):.2f}s"
+                     f" / 最大 {max(ttfts):.2f}s")
+        return line
+
+    def close(self) -> None:
+        self.session.close()
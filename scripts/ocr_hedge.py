@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+多服务商对冲（hedged）OCR 请求（ocr.py --hedge 使用）
+
+一页先发给主服务商；若在「主服务商历史延迟的 p 分位」内还没有结果，
+再向备用服务商补发一份相同的请求，谁先成功用谁。主服务商提前报错时
+立即补发，不等阈值。样本不足时用固定的 --hedge-after 秒作为阈值。
+
+慢请求本身无法从另一线程中止：落败的请求在后台守护线程里跑完，
+结果丢弃，但其延迟照样记入直方图，使阈值反映真实的尾延迟。
+给出 max_in_flight（ocr.py 取 --workers）时，每个服务商同时在途的请求
+（含已落败、仍在跑的）不超过这个数：主请求排队等名额，补发请求拿不到
+名额就先不补发、继续等在途的请求，所以落败请求不会越积越多、持续消耗限速配额。
+
+每个服务商维护一份对数分桶的延迟直方图（仅成功请求），结束时打印
+分位数、胜出次数与对冲次数。
+
+用法:
+  primary = Provider("openrouter", client_a, model_a, prompt_a, build_a)
+  hedge = HedgedOCR([primary, Provider("bigmodel", client_b, ...)], percentile=0.95, max_in_flight=4)
+  text, winner = hedge.recognize("page-1.png", label="第 1 页")
+  print(hedge.report())
+"""
+
+import math
+import time
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+
+from ocr_client import OCRClient
+from ocr_payload import DataURIJSONBody, guess_mime
+
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_HEDGE_AFTER = 15.0
+HEDGE_MIN_SAMPLES = 8
+HEDGE_FLOOR = 0.5
+# 延迟直方图桶的上界：0.1s 起按 √2 递增，约到 290s
+BUCKET_BOUNDS = [0.1 * 2 ** (k / 2) for k in range(24)]
+
+
+def _seconds(x: float) -> str:
+    """两位有效数字（0.14、1.4、11），不用科学计数法"""
+    return f"{x:.2g}" if x < 100 else f"{x:.0f}"
+
+
+class LatencyHistogram:
+    """线程安全的对数分桶延迟直方图，内存与样本数无关"""
+
+    def __init__(self, bounds: list[float] = BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        # bounds 是等比数列，直接算桶号，不必二分
+        k = 0 if seconds <= self.bounds[0] else math.ceil(2 * math.log2(seconds / self.bounds[0]) - 1e-9)
+        with self._lock:
+            self.counts[min(k, len(self.bounds))] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def fail(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def percentile(self, q: float) -> float | None:
+        """q 分位所在桶的上界（偏保守）；没有样本时返回 None"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(q * self.count))
+            seen = 0
+            for k, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    return self.bounds[k] if k < len(self.bounds) else self.max
+        return self.max
+
+    def format(self, width: int = 30) -> list[str]:
+        with self._lock:
+            counts = list(self.counts)
+        peak = max(counts) or 1
+        lines = []
+        for k, c in enumerate(counts):
+            if not c:
+                continue
+            edge = f"≤{_seconds(self.bounds[k])}s" if k < len(self.bounds) else f">{_seconds(self.bounds[-1])}s"
+            lines.append(f"    {edge:>8} {'█' * max(1, round(c * width / peak))} {c}")
+        return lines
+
+
+@dataclass
+class Provider:
+    """一个 OCR 服务商：客户端 + 模型 + 提示词 + 请求体构造"""
+    name: str
+    client: OCRClient
+    model: str
+    prompt: str
+    build_payload: Callable[[str], dict]      # data URI → chat/completions 请求体
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    wins: int = 0
+
+    def recognize(self, image_path: str, label: str = "") -> str:
+        mime = guess_mime(image_path, default="image/png")
+        start = time.monotonic()
+        try:
+            data = self.client.chat(lambda: DataURIJSONBody(image_path, mime, self.build_payload),
+                                    label=f"[{self.name}] {label}".strip())
+            content = data["choices"][0]["message"]["content"]
+        except Exception:
+            self.latency.fail()
+            raise
+        self.latency.record(time.monotonic() - start)
+        return content
+
+
+def _run(provider: Provider, image_path: str, label: str, slots: threading.Semaphore | None = None) -> Future:
+    """在守护线程里发请求：落败的请求不会在进程退出时被等待；请求结束时归还 slots 名额"""
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def target():
+        try:
+            future.set_result(provider.recognize(image_path, label))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            if slots:
+                slots.release()
+
+    threading.Thread(target=target, daemon=True, name=f"ocr-{provider.name}").start()
+    return future
+
+
+class HedgedOCR:
+    """按顺序排列的服务商：providers[0] 为主，其余依次作为对冲备份"""
+
+    def __init__(self, providers: list[Provider], percentile: float = DEFAULT_PERCENTILE,
+                 hedge_after: float = DEFAULT_HEDGE_AFTER, min_samples: int = HEDGE_MIN_SAMPLES,
+                 max_in_flight: int | None = None):
+        if not providers:
+            raise ValueError("至少需要一个服务商")
+        self.providers = providers
+        self.percentile = percentile
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self.max_in_flight = max_in_flight
+        # 每个服务商一个名额池，所有工作线程共用
+        self._slots = {p.name: threading.BoundedSemaphore(max_in_flight) for p in providers} if max_in_flight else {}
+        self.hedges = 0
+        self.deferred = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, provider: Provider) -> float:
+        """多久没有结果就补发下一家：样本足够时取该服务商的 p 分位延迟"""
+        if provider.latency.count < self.min_samples:
+            return self.hedge_after
+        return max(HEDGE_FLOOR, provider.latency.percentile(self.percentile))
+
+    def recognize(self, image_path: str, label: str = "") -> tuple[str, Provider]:
+        """返回 (识别结果, 胜出的服务商)；全部失败时抛出最后一个错误"""
+        pending: dict[Future, Provider] = {}
+        remaining = list(self.providers)
+        error: BaseException | None = None
+        deferred = False
+        while remaining or pending:
+            if remaining:
+                provider = remaining[0]
+                slots = self._slots.get(provider.name)
+                # 没有在途请求时排队等名额；补发时不等，名额满了就稍后再试
+                if slots is None or slots.acquire(blocking=not pending):
+                    remaining.pop(0)
+                    if pending:
+                        with self._lock:
+                            self.hedges += 1
+                    pending[_run(provider, image_path, label, slots)] = provider
+                    timeout = self.hedge_delay(provider) if remaining else None
+                else:
+                    if not deferred:
+                        deferred = True
+                        with self._lock:
+                            self.deferred += 1
+                    timeout = HEDGE_FLOOR
+            else:
+                timeout = None
+            deadline = None if timeout is None else time.monotonic() + timeout
+            # 等到有请求完成，或到了补发下一家的时间
+            while pending:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                done, _ = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    winner = pending.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    with self._lock:
+                        winner.wins += 1
+                    return text, winner
+                if remaining:
+                    break   # 有请求失败：不等阈值，立即补发下一家
+        raise error
+
+    def report(self) -> str:
+        lines = [f"对冲请求 {self.hedges} 次（阈值: 主服务商 p{self.percentile * 100:g} 延迟，"
+                 f"样本不足 {self.min_samples} 个时为 {self.hedge_after:g}s）"]
+        if self.max_in_flight:
+            lines[0] += f"；每家在途上限 {self.max_in_flight}，因名额已满推迟补发 {self.deferred} 页"
+        for p in self.providers:
+            h = p.latency
+            if h.count:
+                pcts = "  ".join(f"p{int(q * 100)} ≤{_seconds(h.percentile(q))}s" for q in (0.5, 0.9, 0.99))
+                lines.append(f"  {p.name} ({p.model}): 胜出 {p.wins}，成功 {h.count}，失败 {h.failures}，"
+                             f"平均 {h.total / h.count:.2f}s，最大 {h.max:.2f}s，{pcts}")
+                lines.extend(h.format())
+            else:
+                lines.append(f"  {p.name} ({p.model}): 胜出 {p.wins}，成功 0，失败 {h.failures}")
+        return "\n".join(lines)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+按页序增量写出 OCR 结果（ocr.py 与 glm-ocr.py 共用）
+
+各页并发识别、乱序完成，输出文件却必须按页序排列。PageWriter 维护
+「下一个该写的页」：这一页的流式文字一到就追加进文件；排在后面的页
+先在内存里攒着，轮到时一次写出。每写完一整页 flush + fsync，
+所以进程中途崩溃时，文件里至少是前面若干完整的页（外加正在写的
+那一页的部分文字），而不是什么都没有。异常退出时已完成、但排在
+未完成页之后的页也会写出，缺的每一页用 <!-- 第 N 页缺失 --> 占位，
+不会让后面的页紧贴着前面的页、看起来像是完整的。
+
+页以 (起始页, 结束页) 标识，glm-ocr.py 的多页段和 ocr.py 的单页同样处理。
+流式文字与最终结果不一致时（中途断线重发、命中缓存没有流式文字），
+以最终结果为准，把该页从页首截断重写。
+
+输出到 stdout 时无法截断重写，只在整页完成时按页序打印。
+
+用法:
+  with PageWriter("output/book.md", separator="\\n\\n---\\n\\n") as out:
+      out.append(3, "增量文字")           # 第 3 页的流式片段
+      out.finish(3, 3, "第 3 页全文")      # 第 3 页完成
+      out.discard(5)                      # 第 5 页段作废（如被截断，拆小重交）
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+
+class PageWriter:
+    """线程安全的按页序增量写出器"""
+
+    def __init__(self, path: str | None = None, separator: str = "\n\n", first: int = 1):
+        self.path = path
+        self.separator = separator
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            self._file = sys.stdout
+        self._stream = path is not None
+        self.next = first                      # 下一个该写的起始页
+        self.pages_written = 0
+        self._done: dict[int, tuple[int, str]] = {}
+        self._buffered: dict[int, list[str]] = {}
+        self._started = False                  # 当前页是否已有流式文字写进文件
+        self._streamed: list[str] = []
+        self._sep_offset = 0                   # 当前页分隔符之前的文件位置
+        self._page_offset = 0                  # 当前页正文开始的文件位置
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "PageWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _begin(self) -> None:
+        if self._stream:
+            self._file.flush()
+            self._sep_offset = self._file.tell()
+        if self.pages_written:
+            self._file.write(self.separator)
+        if self._stream:
+            self._file.flush()
+            self._page_offset = self._file.tell()
+        self._started = True
+
+    def _rewind(self, offset: int) -> None:
+        self._file.flush()
+        self._file.seek(offset)
+        self._file.truncate()
+
+    def append(self, first: int, delta: str) -> None:
+        """第 first 页（段）的一段流式文字"""
+        with self._lock:
+            if self._stream and first == self.next:
+                if not self._started:
+                    self._begin()
+                self._file.write(delta)
+                self._file.flush()
+                self._streamed.append(delta)
+            else:
+                self._buffered.setdefault(first, []).append(delta)
+
+    def discard(self, first: int) -> None:
+        """丢弃第 first 页（段）已收到的流式文字"""
+        with self._lock:
+            self._buffered.pop(first, None)
+            if first == self.next and self._started:
+                self._rewind(self._sep_offset)
+                self._started = False
+                self._streamed.clear()
+
+    def finish(self, first: int, last: int, text: str) -> None:
+        """第 first–last 页完成；轮到它时写出，并接着写出已完成的后续页"""
+        with self._lock:
+            self._done[first] = (last, text)
+            while self.next in self._done:
+                last, text = self._done.pop(self.next)
+                self._buffered.pop(self.next, None)
+                self._write_page(text)
+                self.next = last + 1
+            # 新的当前页如果已经在流式输出，把攒下的片段先写进文件
+            pending = self._buffered.pop(self.next, None)
+            if pending and self._stream:
+                self._begin()
+                self._file.write("".join(pending))
+                self._file.flush()
+                self._streamed = pending
+
+    def _write_page(self, text: str) -> None:
+        if not self._started:
+            self._begin()
+        elif "".join(self._streamed) != text:
+            self._rewind(self._page_offset)
+            self._streamed = []
+        if not self._streamed:
+            self._file.write(text)
+        self._file.flush()
+        if self._stream:
+            os.fsync(self._file.fileno())
+        self.pages_written += 1
+        self._started = False
+        self._streamed = []
+
+    def close(self) -> None:
+        with self._lock:
+            # 没写完的当前页（异常退出）截掉，文件停在页边界
+            if self._stream and self._started:
+                self._rewind(self._sep_offset)
+                self._started = False
+                self._streamed = []
+            if self._done:
+                # 前面有页始终没有完成（异常退出）：缺的页写占位，再按页序写出剩下的，不丢结果
+                for first in sorted(self._done):
+                    for page in range(self.next, first):
+                        self._write_page(f"<!-- 第 {page} 页缺失 -->")
+                    last, text = self._done[first]
+                    self._write_page(text)
+                    self.next = last + 1
+                self._done.clear()
+            self._file.flush()
+            if self._stream:
+                os.fsync(self._file.fileno())
+                self._file.close()
+            else:
+                self._file.write("\n")
+                self._file.flush()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+流式构建 OCR 请求体（ocr.py 与 glm-ocr.py 共用）
+
+原做法：读入整个文件 → base64 → decode 成 str → requests 再 json.dumps 一遍，
+同一份数据在内存里有四份。这里把 JSON 拆成「前缀 + base64 数据 + 后缀」三段，
+base64 部分直接从 mmap 分块编码，边读边发；已发送的页面立即 madvise 释放，
+峰值内存只和块大小有关，与文件大小无关。
+
+用法:
+  body = DataURIJSONBody(path, mime, build_payload)
+  requests.post(url, data=body, headers={"Content-Type": "application/json", ...})
+
+build_payload(url) 返回请求 dict，url 处放入占位符即可，Content-Length 会自动计算。
+"""
+
+import os
+import json
+import mmap
+import binascii
+from collections.abc import Callable
+from pathlib import Path
+
+from profiling import profiler
+
+MIME_MAP = {
+    ".pdf": "application/pdf",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+}
+
+# 3 的倍数，保证分块 base64 拼接后与一次性编码结果一致
+RAW_CHUNK = 3 * 64 * 1024
+_PLACEHOLDER = "\0DATA_URI\0"
+
+
+def guess_mime(file_path: str, default: str | None = None) -> str:
+    """按扩展名判断 MIME 类型；未知格式且无默认值时抛出 ValueError"""
+    suffix = Path(file_path).suffix.lower()
+    mime = MIME_MAP.get(suffix, default)
+    if not mime:
+        raise ValueError(f"不支持的文件格式: {suffix}")
+    return mime
+
+
+class DataURIJSONBody:
+    """把 data URI 内嵌进 JSON 的流式请求体，可直接作为 requests 的 data 参数
+
+    提供 read()/__iter__/__len__：requests 据 __len__ 设置 Content-Length，
+    再由 urllib3 分块 read() 发送。每个实例只能发送一次，重试时需新建。
+    """
+
+    def __init__(self, file_path: str, mime: str, build_payload: Callable[[str], dict], chunk_size: int = RAW_CHUNK):
+        text = json.dumps(build_payload(_PLACEHOLDER), ensure_ascii=False)
+        marker = json.dumps(_PLACEHOLDER)[1:-1]
+        head, tail = text.split(marker)
+        self._prefix = (head + f"data:{mime};base64,").encode("utf-8")
+        self._suffix = tail.encode("utf-8")
+        self._chunk = chunk_size - chunk_size % 3 or 3
+        self._file = open(file_path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        if self._mm is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._pos = 0
+        self._released = 0
+        self._buf = self._prefix
+        self._off = 0
+        self._suffix_sent = False
+
+    def __len__(self) -> int:
+        return len(self._prefix) + 4 * ((self._size + 2) // 3) + len(self._suffix)
+
+    def _next_block(self) -> bytes:
+        if self._pos < self._size:
+            end = min(self._pos + self._chunk, self._size)
+            with profiler.stage("encode", bytes=end - self._pos), memoryview(self._mm) as view:
+                block = binascii.b2a_base64(view[self._pos:end], newline=False)
+            self._pos = end
+            self._release()
+            return block
+        if not self._suffix_sent:
+            self._suffix_sent = True
+            self.close()
+            return self._suffix
+        return b""
+
+    def _release(self) -> None:
+        """已编码的整页交还内核，避免文件页堆积在 RSS 里"""
+        upto = self._pos - self._pos % mmap.PAGESIZE
+        if upto > self._released and hasattr(mmap, "MADV_DONTNEED"):
+            self._mm.madvise(mmap.MADV_DONTNEED, self._released, upto - self._released)
+            self._released = upto
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            parts = [self._buf[self._off:], *iter(self._next_block, b"")]
+            self._buf, self._off = b"", 0
+            return b"".join(parts)
+        if self._off >= len(self._buf):
+            self._buf, self._off = self._next_block(), 0
+        out = self._buf[self._off:self._off + size]
+        self._off += len(out)
+        return out
+
+    def __iter__(self):
+        if self._off < len(self._buf):
+            yield self._buf[self._off:]
+        self._buf, self._off = b"", 0
+        yield from iter(self._next_block, b"")
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+OCR 上传前的图片预处理（ocr.py --preprocess 使用，需要 Pillow）
+
+- 自适应 DPI：按 PDF 每页的尺寸选渲染分辨率，使长边约 TARGET_LONG_EDGE 像素
+  （限制在 MIN_DPI–MAX_DPI），小开本不再被渲染成超大图（只需 pdfinfo）
+- 纯文字扫描页（灰度直方图中间调极少）：转灰度 + Otsu 二值化，存 1 位 PNG
+- 含插图的页：保留色彩，存 JPEG，质量逐级下调
+- 仍超出字节预算时按 0.8 倍逐步缩小，直到不超过预算；结果比原图还大时保留原图
+
+对比工具：对一组本地样张（图片文件或目录）比较预处理前后的上传字节数，加 --ocr 时
+分别识别两版，报告延迟和两版文字的相似度；样张旁有同名 .txt 时另算与参考文本的一致度。
+仓库里现成的样张只有一张报纸剪报（图文混排）；扫描书页可先用 pdftoppm 渲染到临时目录。
+
+用法:
+  python3 scripts/ocr_preprocess.py public_assets/images/newspaper/     # 只比较字节数（离线）
+  pdftoppm -r 300 -png -f 1 -l 5 book.pdf /tmp/pages/page
+  python3 scripts/ocr_preprocess.py /tmp/pages/ --ocr                   # 需要 OPENROUTER_API_KEY
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import argparse
+import difflib
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TARGET_LONG_EDGE = 2200
+MIN_DPI = 100
+MAX_DPI = 300
+DEFAULT_BUDGET_KB = 350
+JPEG_QUALITIES = (85, 75, 65, 50)
+SHRINK = 0.8
+MIN_LONG_EDGE = 1000
+# 纯文字页：灰度 64–191 之间的像素占比低于此值（扫描文字页近似双峰分布）
+TEXT_MIDTONE_MAX = 0.08
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+PAGE_SIZE_RE = re.compile(r"^Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)\s+pts", re.MULTILINE)
+
+
+def require_pillow() -> None:
+    if Image is None:
+        print("图片预处理需要安装 Pillow: pip install Pillow", file=sys.stderr)
+        sys.exit(1)
+
+
+def page_sizes(pdf_path: str, total: int) -> dict[int, tuple[float, float]]:
+    """每页尺寸（pt），一次 pdfinfo 调用取全部页；读不到的页不在结果中"""
+    out = subprocess.run(["pdfinfo", "-f", "1", "-l", str(total), pdf_path],
+                         check=True, capture_output=True, text=True).stdout
+    return {int(m.group(1)): (float(m.group(2)), float(m.group(3))) for m in PAGE_SIZE_RE.finditer(out)}
+
+
+def adaptive_dpi(width_pt: float, height_pt: float, target: int = TARGET_LONG_EDGE) -> int:
+    """让长边约 target 像素的 DPI，取整到 10"""
+    dpi = target * 72 / max(width_pt, height_pt, 1)
+    return int(min(MAX_DPI, max(MIN_DPI, round(dpi / 10) * 10)))
+
+
+def otsu_threshold(histogram: list[int]) -> int:
+    """256 级灰度直方图的 Otsu 阈值"""
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    weight_bg = sum_bg = 0
+    best, threshold = -1.0, 127
+    for i, h in enumerate(histogram):
+        weight_bg += h
+        if not weight_bg:
+            continue
+        weight_fg = total - weight_bg
+        if not weight_fg:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def is_text_only(gray) -> bool:
+    histogram = gray.histogram()
+    return sum(histogram[64:192]) / max(1, sum(histogram)) < TEXT_MIDTONE_MAX
+
+
+@dataclass
+class Preprocessed:
+    path: str
+    original_bytes: int
+    bytes: int
+    mode: str
+    size: tuple[int, int]
+
+
+def _encode(image, text: bool, threshold: int, budget: int) -> tuple[bytes, str]:
+    """本尺寸下最好的编码：文字页 1 位 PNG，插图页从高到低试 JPEG 质量"""
+    buf = io.BytesIO()
+    if text:
+        image.point(lambda v: 255 if v > threshold else 0).convert("1").save(buf, "PNG", optimize=True)
+        return buf.getvalue(), "1-bit PNG"
+    data = b""
+    for quality in JPEG_QUALITIES:
+        buf = io.BytesIO()
+        image.save(buf, "JPEG", quality=quality, optimize=True)
+        data = buf.getvalue()
+        if len(data) <= budget:
+            break
+    return data, f"JPEG q{quality}"
+
+
+def preprocess_image(path: str, budget: int = DEFAULT_BUDGET_KB * 1024, out_dir: str | None = None) -> Preprocessed:
+    """预处理一张页面图片，写到 out_dir（默认原目录）下的 pre.<名>.png/.jpg
+
+    前缀而非后缀命名，免得与 pdftoppm 的 page-N.png 混在一起被再次当作页面。
+    """
+    require_pillow()
+    original = os.path.getsize(path)
+    with Image.open(path) as img:
+        img.load()
+        gray = img.convert("L")
+        text = is_text_only(gray)
+        if text:
+            base, threshold = gray, otsu_threshold(gray.histogram())
+        else:
+            base, threshold = (img if img.mode in ("L", "RGB") else img.convert("RGB")), 0
+        scale = 1.0
+        while True:
+            size = (max(1, round(base.width * scale)), max(1, round(base.height * scale)))
+            image = base if scale == 1.0 else base.resize(size, Image.LANCZOS)
+            data, mode = _encode(image, text, threshold, budget)
+            if len(data) <= budget or max(size) * SHRINK < MIN_LONG_EDGE:
+                break
+            scale *= SHRINK
+    if original <= len(data):
+        return Preprocessed(path, original, original, "original", (base.width, base.height))
+    out = Path(out_dir or Path(path).parent) / f"pre.{Path(path).stem}{'.png' if text else '.jpg'}"
+    with open(out, "wb") as f:
+        f.write(data)
+    return Preprocessed(str(out), original, len(data), mode, size)
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def compare(fixtures: list[str], budget: int, ocr: bool) -> None:
+    """样张对比：上传字节数，以及（--ocr 时）识别延迟与文字一致度"""
+    require_pillow()
+    found = [p for arg in map(Path, fixtures) for p in (sorted(arg.iterdir()) if arg.is_dir() else [arg])]
+    images = [p for p in found if p.suffix.lower() in IMAGE_SUFFIXES and not p.name.startswith("pre.")]
+    if not images:
+        print(f"错误: {' '.join(fixtures)} 中没有 PNG/JPG 样张", file=sys.stderr)
+        sys.exit(1)
+    client = None
+    if ocr:
+        import ocr as ocr_script
+        from ocr_client import OCRClient
+        api_key = os.environ.get("OPENROUTER_API_KEY")
+        if not api_key:
+            print("错误: --ocr 需要设置 OPENROUTER_API_KEY 环境变量", file=sys.stderr)
+            sys.exit(1)
+        client = OCRClient(ocr_script.API_BASE, api_key)
+
+    def recognize(path):
+        start = time.perf_counter()
+        text = ocr_script.ocr_image(path, client, ocr_script.DEFAULT_MODEL)
+        return text, time.perf_counter() - start
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="ocr-pre-") as tmp:
+        for path in images:
+            pre = preprocess_image(str(path), budget, tmp)
+            row = {"image": path.name, "orig_kb": pre.original_bytes // 1024, "pre_kb": pre.bytes // 1024,
+                   "saved": f"{1 - pre.bytes / pre.original_bytes:.0%}", "mode": pre.mode,
+                   "size": f"{pre.size[0]}x{pre.size[1]}"}
+            if client:
+                before, t_before = recognize(str(path))
+                after, t_after = recognize(pre.path)
+                row.update(orig_s=f"{t_before:.2f}", pre_s=f"{t_after:.2f}", same=f"{_similarity(before, after):.3f}")
+                truth = path.with_suffix(".txt")
+                if truth.exists():
+                    expected = truth.read_text(encoding="utf-8")
+                    row.update(orig_acc=f"{_similarity(expected, before):.3f}", pre_acc=f"{_similarity(expected, after):.3f}")
+            rows.append(row)
+    columns = [c for c in ("image", "orig_kb", "pre_kb", "saved", "mode", "size", "orig_s", "pre_s", "same",
+                           "orig_acc", "pre_acc") if any(c in r for r in rows)]
+    widths = [max(len(c), *(len(str(r.get(c, "-"))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r.get(c, "-")).ljust(w) for c, w in zip(columns, widths)))
+    orig = sum(r["orig_kb"] for r in rows)
+    pre = sum(r["pre_kb"] for r in rows)
+    print(f"合计上传 {orig} KB → {pre} KB（节省 {1 - pre / max(1, orig):.0%}）", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR 图片预处理效果对比")
+    parser.add_argument("fixtures", nargs="+", help="样张图片或目录（PNG/JPG，可附同名 .txt 参考文本）")
+    parser.add_argument("--budget-kb", type=int, default=DEFAULT_BUDGET_KB,
+                        help=f"每页上传字节预算，KB (默认 {DEFAULT_BUDGET_KB})")
+    parser.add_argument("--ocr", action="store_true", help="分别识别原图与预处理图，比较延迟和文字（调用 API）")
+    args = parser.parse_args()
+    compare(args.fixtures, args.budget_kb * 1024, args.ocr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+两档识别的质量门（ocr.py --two-tier 使用）
+
+一档：所有页按较低 DPI 渲染、用默认模型识别。识别结果在本地打分
+（不调用 API）：字符类别占比、替换字符 / 私用区字符、逐字断行
+（沿用 pdf_text_layer.judge），再加两条 OCR 特有的检查：
+  - 输出明显短于已通过页的中位数（漏识别半页、只认出页眉）
+  - 重复行过多（视觉模型陷入复读）
+不合格的页才升到二档：按较高 DPI 重新渲染，或（给了 --tier2-model 时）
+同时换用更强的模型再识别一次。两档结果都不合格时取得分较高的一版。
+
+每页的分档决定（档位、DPI、模型、字数、正常字符占比、升档原因）
+可写成 JSON lines 报告（--tier-report）。
+
+用法:
+  gate = QualityGate(recognize_low, recognize_high, rerender, page_of,
+                     tier1=("z-ai/glm-4.6v", 150), tier2=("z-ai/glm-4.6v", 300))
+  text = gate.recognize("page-7.png", "第 7 页")
+  gate.write_report("output/book.tiers.jsonl")
+  print(gate.summary())
+"""
+
+import json
+import statistics
+import threading
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from pdf_text_layer import PageVerdict, judge
+
+TIER1_DPI = 150
+TIER2_DPI = 300
+# 已通过页不少于这么多时才按中位数判断「过短」
+SHORT_MIN_SAMPLES = 5
+SHORT_RATIO = 0.3
+# 非空行中重复行的占比上限（至少 REPEAT_MIN_LINES 行时才判断）
+MAX_REPEAT_RATIO = 0.5
+REPEAT_MIN_LINES = 6
+
+
+def assess(text: str, median_chars: float | None = None) -> PageVerdict:
+    """给一页 OCR 结果打分；median_chars 为已通过页字数的中位数（样本不足时为 None）"""
+    verdict = judge(text)
+    if not verdict.usable:
+        return verdict
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    if len(lines) >= REPEAT_MIN_LINES and 1 - len(set(lines)) / len(lines) > MAX_REPEAT_RATIO:
+        return PageVerdict(False, verdict.chars, verdict.good_ratio, "重复行过多（模型复读？）")
+    if median_chars and verdict.chars < SHORT_RATIO * median_chars:
+        return PageVerdict(False, verdict.chars, verdict.good_ratio, "输出明显短于其他页")
+    return verdict
+
+
+def _score(v: PageVerdict) -> float:
+    return v.chars * v.good_ratio
+
+
+@dataclass
+class TierDecision:
+    page: int
+    tier: int
+    model: str
+    dpi: int | None
+    chars: int
+    good_ratio: float
+    reason: str = ""            # 一档不合格的原因（未升档时为空）
+    tier2_reason: str = ""      # 二档仍不合格的原因
+
+
+class QualityGate:
+    """包装两档 recognize(图片路径, 标签, on_delta)，按一档结果的质量决定是否升档
+
+    rerender(图片路径) 返回同一页的高 DPI 图片路径（None 表示不重新渲染，
+    例如单张图片只换模型）；page_of(图片路径) 给出报告里的页码。
+    一档的输出可能被丢弃，不做流式回调；二档照常把 on_delta 传下去。
+    """
+
+    def __init__(self, recognize1: Callable[..., str], recognize2: Callable[..., str],
+                 rerender: Callable[[str], str] | None, page_of: Callable[[str], int],
+                 tier1: tuple[str, int | None], tier2: tuple[str, int | None]):
+        self.recognize1 = recognize1
+        self.recognize2 = recognize2
+        self.rerender = rerender
+        self.page_of = page_of
+        self.tier1 = tier1
+        self.tier2 = tier2
+        self.decisions: dict[int, TierDecision] = {}
+        self._passed_chars: list[int] = []
+        self._lock = threading.Lock()
+
+    def _median(self) -> float | None:
+        with self._lock:
+            if len(self._passed_chars) < SHORT_MIN_SAMPLES:
+                return None
+            return statistics.median(self._passed_chars)
+
+    def _decide(self, page: int, tier: int, verdict: PageVerdict, reason: str = "", tier2_reason: str = "") -> None:
+        model, dpi = self.tier1 if tier == 1 else self.tier2
+        with self._lock:
+            self.decisions[page] = TierDecision(page, tier, model, dpi, verdict.chars,
+                                                round(verdict.good_ratio, 4), reason, tier2_reason)
+            if tier == 1 and not reason:
+                self._passed_chars.append(verdict.chars)
+
+    def recognize(self, image_path: str, label: str = "", on_delta: Callable[[str], None] | None = None) -> str:
+        page = self.page_of(image_path)
+        try:
+            text = self.recognize1(image_path, label)
+        except Exception:
+            text, first = None, PageVerdict(False, 0, 0.0, "一档识别失败")
+        else:
+            first = assess(text, self._median())
+            if first.usable:
+                self._decide(page, 1, first)
+                return text
+
+        high = image_path
+        try:
+            if self.rerender:
+                high = self.rerender(image_path)
+            better = self.recognize2(high, f"{label}（二档）".strip(), on_delta)
+        except Exception:
+            if text is None:
+                raise
+            self._decide(page, 1, first, first.reason, "二档识别失败，保留一档结果")
+            return text
+        finally:
+            if high != image_path:
+                Path(high).unlink(missing_ok=True)
+        second = assess(better, self._median())
+        if second.usable or text is None or _score(second) >= _score(first):
+            self._decide(page, 2, second, first.reason, second.reason)
+            return better
+        self._decide(page, 1, first, first.reason, f"二档得分更低（{second.reason}），保留一档结果")
+        return text
+
+    def record_external(self, page: int, source: str, chars: int) -> None:
+        """不经过 OCR 的页（如直接采用的文字层）也记进报告，tier=0"""
+        with self._lock:
+            self.decisions[page] = TierDecision(page, 0, source, None, chars, 1.0)
+
+    def write_report(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for page in sorted(self.decisions):
+                f.write(json.dumps(asdict(self.decisions[page]), ensure_ascii=False) + "\n")
+
+    def summary(self) -> str:
+        decisions = list(self.decisions.values())
+        passed = sum(d.tier == 1 and not d.reason for d in decisions)
+        escalated = [d for d in decisions if d.reason]
+        kept = sum(d.tier == 2 for d in escalated)
+        external = sum(d.tier == 0 for d in decisions)
+        reasons = Counter(d.reason for d in escalated)
+        line = (f"质量门: 一档通过 {passed} 页，升二档 {len(escalated)} 页（采用二档结果 {kept} 页）"
+                + (f"，文字层 {external} 页" if external else ""))
+        if reasons:
+            line += "；升档原因: " + "，".join(f"{r} ×{n}" for r, n in reasons.most_common())
+        return line
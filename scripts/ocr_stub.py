@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+本地 OCR 桩服务器：OpenAI 兼容的 chat/completions，只用标准库 http.server
+
+用于离线检查 ocr_client.py 的重试与限速、ocr_hedge.py 的对冲逻辑（见 bench.py 的
+retry / hedge 基准），也可单独启动，把 ocr.py / glm-ocr.py 指过来手动试：
+  OPENROUTER_API_BASE=http://127.0.0.1:8765 OPENROUTER_API_KEY=x python3 scripts/ocr.py book.pdf
+
+- 每个请求先等 delay + [0, jitter) 秒（按 slow_rate 的概率再多等 slow_delay 秒，模拟长尾），再按 fail_rate 的概率返回 429 / 500 / 503
+  （429 带 Retry-After）；同一份请求内容最多连续失败 max_failures 次，重试必定能成功
+- 识别结果取自图片 data URI：内容是 UTF-8 文本时原样返回（便于核对页序），否则返回哈希
+- 支持 "stream": true 的 SSE 响应，文字分两段发出
+- GET /stats 返回请求数、失败数和同时在途的最大请求数
+
+用法:
+  python3 scripts/ocr_stub.py [--port 8765] [--delay 0.2] [--jitter 0.2] [--fail-rate 0.3]
+                              [--slow-rate 0.1 --slow-delay 5]
+
+  with StubServer(delay=0.05, fail_rate=0.3) as stub:
+      client = OCRClient(stub.url, "x")
+      ...
+      print(stub.stats())
+"""
+
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAIL_STATUSES = (429, 500, 503)
+
+
+class StubServer:
+    """在后台线程里运行的桩服务器；port=0 时由系统分配端口"""
+
+    def __init__(self, port: int = 0, delay: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+                 max_failures: int = 2, retry_after: float = 1.0, slow_rate: float = 0.0, slow_delay: float = 0.0,
+                 seed: int | None = None):
+        self.delay = delay
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.fail_rate = fail_rate
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._streak: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="ocr-stub")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "failures": self.failures, "max_in_flight": self.max_in_flight}
+
+    def _begin(self, body: bytes) -> int | None:
+        """记账并决定这次请求是否失败；返回失败状态码或 None"""
+        key = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            wait = self.delay + self._random.random() * self.jitter
+            if self._random.random() < self.slow_rate:
+                wait += self.slow_delay
+            fail = self._streak.get(key, 0) < self.max_failures and self._random.random() < self.fail_rate
+            if fail:
+                self.failures += 1
+                self._streak[key] = self._streak.get(key, 0) + 1
+                status = self._random.choice(FAIL_STATUSES)
+            else:
+                self._streak.pop(key, None)
+                status = None
+        time.sleep(wait)
+        return status
+
+    def _end(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+def _reply_text(payload: dict) -> str:
+    """图片 data URI 的内容是 UTF-8 文本时原样返回，否则返回其哈希"""
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        for part in content if isinstance(content, list) else ():
+            url = (part.get("image_url") or {}).get("url", "")
+            if url.startswith("data:") and "," in url:
+                data = base64.b64decode(url.split(",", 1)[1])
+                try:
+                    return data.decode("utf-8")
+                except UnicodeDecodeError:
+                    return f"image {hashlib.sha256(data).hexdigest()[:16]}"
+    return ""
+
+
+def _handler(stub: StubServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                parts = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                    if not size:
+                        self.rfile.readline()
+                        return b"".join(parts)
+                    parts.append(self.rfile.read(size))
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_GET(self) -> None:
+            self._send(200, json.dumps(stub.stats()).encode())
+
+        def do_POST(self) -> None:
+            body = self._read_body()
+            status = stub._begin(body)
+            try:
+                if status:
+                    headers = {"Retry-After": f"{stub.retry_after:g}"} if status == 429 else None
+                    self._send(status, b'{"error": "stub failure"}', headers)
+                    return
+                payload = json.loads(body)
+                text = _reply_text(payload)
+                if not payload.get("stream"):
+                    self._send(200, json.dumps({"model": payload.get("model"), "choices": [
+                        {"message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}).encode())
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                half = len(text) // 2
+                events = [{"choices": [{"delta": {"content": piece}}]} for piece in (text[:half], text[half:]) if piece]
+                events.append({"choices": [{"delta": {}, "finish_reason": "stop"}]})
+                for event in [*map(json.dumps, events), "[DONE]"]:
+                    data = f"data: {event}\n\n".encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            finally:
+                stub._end()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OCR 桩服务器（OpenAI 兼容 chat/completions）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.2, help="每个请求的固定延迟，秒 (默认 0.2)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="额外随机延迟的上限，秒 (默认 0.2)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 429/500/503 的概率 (默认 0)")
+    parser.add_argument("--max-failures", type=int, default=2, help="同一请求最多连续失败几次 (默认 2)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="慢请求（长尾）的概率 (默认 0)")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="慢请求额外等待的秒数 (默认 5)")
+    args = parser.parse_args()
+    stub = StubServer(args.port, args.delay, args.jitter, args.fail_rate, args.max_failures,
+                      slow_rate=args.slow_rate, slow_delay=args.slow_delay)
+    print(f"桩服务器: {stub.url}（Ctrl-C 退出）", file=sys.stderr)
+    with stub:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Random access to the form-feed pages of a large UTF-8 text dump
+(pdftotext / OCR full_text.txt) through a memory-mapped file.
+
+The byte offset of every '\\f' is found once (mmap.find, no decoding)
+and kept in an array; page(i) decodes just that slice. Substring
+searches run over the raw bytes and map a hit back to its page by
+bisection, so locating the start and end pages of a thesis is a single
+byte scan, and nothing is decoded until a page is actually read.
+Scanned ranges are madvise'd away afterwards, so resident memory is
+bounded by the pages actually read, not the file size.
+
+The offsets can be saved to a sidecar file, which is reused as long as
+the text file's size and mtime still match, so reopening a big file is
+instant:
+
+  with PageIndex('full_text.txt', sidecar='full_text.txt.pages') as pages:
+      first = pages.find('“边塞”一词')
+      end = pages.find_heading('注释', first)
+      for text in pages.iter_pages(first, end): ...
+
+Universal newlines are applied per page, so page text matches what
+reading the file in text mode and splitting on '\\f' would give.
+"""
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator
+
+FORM_FEED = b'\f'
+SCAN_WINDOW = 8 << 20
+SIDECAR_MAGIC = b'PGIDX1\0\0'
+_EOL = (b'\n', b'\r')
+_SIDECAR_HEADER = struct.Struct('<8sQQQ')   # magic, file size, mtime_ns, page count
+
+
+class PageIndex:
+    """Form-feed page offsets over a memory-mapped UTF-8 text file."""
+
+    def __init__(self, path: str, sidecar: str | None = None):
+        self.path = path
+        self._file = open(path, 'rb')
+        st = os.fstat(self._file.fileno())
+        self._size = st.st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        key = (st.st_size, st.st_mtime_ns)
+        starts = self._load_sidecar(sidecar, key) if sidecar else None
+        if starts is None:
+            starts = self._scan()
+            if sidecar:
+                self._save_sidecar(sidecar, key, starts)
+        # starts[i] is the first byte of page i; starts[-1] is one past the end.
+        self._starts = starts
+
+    def _scan(self) -> array:
+        starts = array('Q', [0])
+        if self._mm is not None:
+            for window in range(0, self._size, SCAN_WINDOW):
+                stop = min(window + SCAN_WINDOW, self._size)
+                find = self._mm.find
+                pos = find(FORM_FEED, window, stop)
+                while pos != -1:
+                    starts.append(pos + 1)
+                    pos = find(FORM_FEED, pos + 1, stop)
+                self._release(window, stop)
+        starts.append(self._size + 1)
+        return starts
+
+    def _find(self, needle: bytes, begin: int) -> int:
+        """mmap.find in SCAN_WINDOW steps, releasing each window once scanned
+        so the peak RSS of a long search stays at one window."""
+        window = begin
+        while window < self._size:
+            stop = min(window + SCAN_WINDOW + len(needle) - 1, self._size)
+            pos = self._mm.find(needle, window, stop)
+            if pos != -1:
+                self._release(begin, pos)
+                return pos
+            window += SCAN_WINDOW
+            self._release(begin, window)
+        return -1
+
+    def _release(self, start: int, end: int) -> None:
+        """Drop scanned pages from this mapping's RSS; they stay in the page
+        cache and fault back in cheaply if a page is read later."""
+        start -= start % mmap.PAGESIZE
+        end = min(end, self._size)
+        end -= end % mmap.PAGESIZE if end < self._size else 0
+        if end > start and hasattr(mmap, 'MADV_DONTNEED'):
+            self._mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    @staticmethod
+    def _load_sidecar(path: str, key: tuple[int, int]) -> array | None:
+        try:
+            with open(path, 'rb') as f:
+                magic, size, mtime_ns, count = _SIDECAR_HEADER.unpack(f.read(_SIDECAR_HEADER.size))
+                if magic != SIDECAR_MAGIC or (size, mtime_ns) != key:
+                    return None
+                starts = array('Q')
+                starts.fromfile(f, count + 1)
+        except (OSError, EOFError, struct.error):
+            return None
+        if sys.byteorder != 'little':
+            starts.byteswap()
+        return starts
+
+    @staticmethod
+    def _save_sidecar(path: str, key: tuple[int, int], starts: array) -> None:
+        data = array('Q', starts)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        tmp = f'{path}.tmp.{os.getpid()}'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(_SIDECAR_HEADER.pack(SIDECAR_MAGIC, *key, len(starts) - 1))
+                data.tofile(f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f'warning: could not write page index {path}: {e}', file=sys.stderr)
+
+    def __len__(self) -> int:
+        return len(self._starts) - 1
+
+    def span(self, i: int) -> tuple[int, int]:
+        """Byte range of page i, without its trailing form feed."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('page index out of range')
+        return self._starts[i], self._starts[i + 1] - 1
+
+    def page(self, i: int) -> str:
+        start, end = self.span(i)
+        if start >= end:
+            return ''
+        text = self._mm[start:end].decode('utf-8')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    __getitem__ = page
+
+    def iter_pages(self, start: int = 0, stop: int | None = None) -> Iterator[str]:
+        """Pages start..stop-1; each is released from RSS once decoded."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for i in range(start, stop):
+            text = self.page(i)
+            if self._mm is not None:
+                self._release(self._starts[i], self._starts[i + 1])
+            yield text
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_pages()
+
+    def page_of(self, offset: int) -> int:
+        """Page number containing byte offset."""
+        return bisect_right(self._starts, offset) - 1
+
+    def find(self, needle: str, start_page: int = 0) -> int | None:
+        """First page at or after start_page whose text contains needle."""
+        if self._mm is None or not needle:
+            return None
+        pos = self._find(needle.encode('utf-8'), self._starts[start_page])
+        return self.page_of(pos) if pos != -1 else None
+
+    def find_heading(self, heading: str, start_page: int = 0) -> int | None:
+        """First page at or after start_page that has heading on a line of
+        its own or starts with it (thesis_clean.is_end_page)."""
+        if self._mm is None or not heading:
+            return None
+        needle = heading.encode('utf-8')
+        pos = self._find(needle, self._starts[start_page])
+        while pos != -1:
+            page = self.page_of(pos)
+            before = self._mm[self._starts[page]:pos]
+            after = self._mm[pos + len(needle):pos + len(needle) + 1]
+            if before[-1:] in _EOL and after in _EOL or not before.decode('utf-8').strip():
+                return page
+            pos = self._find(needle, pos + 1)
+        return None
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> 'PageIndex':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 scripts/page_index.py <full_text.txt> [<sidecar>]", file=sys.stderr)
+        sys.exit(1)
+    with PageIndex(sys.argv[1], sidecar=sys.argv[2] if len(sys.argv) == 3 else None) as index:
+        print(f"{len(index)} pages")
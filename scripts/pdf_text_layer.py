@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+PDF 自带文字层的快速通道（ocr.py 使用）
+
+原生电子版 PDF（如 essay4_zhangqiuge 的论文）本身有可用的文字层，
+没必要逐页渲染再交给视觉模型。这里用一次 pdftotext 取出全部页的文字
+（\\f 分页，与 full_text.txt 同格式），经 page_index.PageIndex 按页读取，
+逐页用启发式判断质量：合格的页直接采用，扫描页（文字层为空）和
+乱码页（替换字符、私用区字符、(cid:N)、逐字断行、错码的拉丁字母）
+才送 OCR。
+
+判断标准（均可调）:
+  - 非空白字符不少于 MIN_CHARS
+  - 汉字、中西文标点、ASCII 可打印字符等「正常字符」占比不低于 MIN_GOOD_RATIO
+  - 坏字符占比不超过 MAX_BAD_RATIO
+  - 只有一个字符的行不超过 MAX_SINGLE_CHAR_LINES（竖排或逐字定位的 PDF 常被拆成一字一行）
+
+用法（查看每页判定，不调用 API）:
+  python3 scripts/pdf_text_layer.py books/essay1/某文章.pdf
+"""
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+
+from page_index import PageIndex
+
+MIN_CHARS = 30
+MIN_GOOD_RATIO = 0.92
+MAX_BAD_RATIO = 0.01
+MAX_SINGLE_CHAR_LINES = 0.4
+CID_PENALTY = 5
+
+# 正常字符所在的 Unicode 区段（左闭右闭）
+_GOOD_RANGES = (
+    (0x21, 0x7E),       # ASCII 可打印
+    (0xB7, 0xB7),       # 间隔号 ·
+    (0x2010, 0x206F),   # 通用标点：—— … “” ‘’
+    (0x2160, 0x217F),   # 罗马数字
+    (0x2460, 0x24FF),   # 带圈数字 ①②③（脚注标记）
+    (0x3000, 0x303F),   # 中文标点
+    (0x3400, 0x4DBF),   # 汉字扩展 A
+    (0x4E00, 0x9FFF),   # 汉字
+    (0xFF00, 0xFFEF),   # 全角字符
+)
+
+
+def _is_good(c: str) -> bool:
+    o = ord(c)
+    return any(lo <= o <= hi for lo, hi in _GOOD_RANGES)
+
+
+def _is_bad(c: str) -> bool:
+    o = ord(c)
+    return o == 0xFFFD or 0xE000 <= o <= 0xF8FF or (o < 0x20 and c not in "\t\n")
+
+
+@dataclass
+class PageVerdict:
+    usable: bool
+    chars: int
+    good_ratio: float
+    reason: str
+
+
+def judge(text: str) -> PageVerdict:
+    """判断一页文字层能否直接使用"""
+    chars = [c for c in text if not c.isspace()]
+    n = len(chars)
+    if n < MIN_CHARS:
+        return PageVerdict(False, n, 0.0, "文字层为空或过少（扫描页？）")
+    good = sum(map(_is_good, chars))
+    bad = sum(map(_is_bad, chars)) + text.count("(cid:") * CID_PENALTY
+    ratio = good / n
+    if bad / n > MAX_BAD_RATIO:
+        return PageVerdict(False, n, ratio, "含替换字符 / 私用区字符 / (cid:N)")
+    if ratio < MIN_GOOD_RATIO:
+        return PageVerdict(False, n, ratio, "异常字符过多（编码错误？）")
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    if sum(len(line) == 1 for line in lines) > MAX_SINGLE_CHAR_LINES * len(lines):
+        return PageVerdict(False, n, ratio, "大量单字行（竖排或逐字定位）")
+    return PageVerdict(True, n, ratio, "")
+
+
+def has_pdftotext() -> bool:
+    return shutil.which("pdftotext") is not None
+
+
+def extract_text_layer(pdf_path: str, out_dir: str) -> PageIndex:
+    """pdftotext 整份导出到 out_dir/text.txt，返回按 \\f 分页的 PageIndex（调用方负责关闭）"""
+    path = os.path.join(out_dir, "text.txt")
+    subprocess.run(["pdftotext", "-enc", "UTF-8", pdf_path, path], check=True, capture_output=True)
+    return PageIndex(path)
+
+
+def usable_pages(pdf_path: str, total: int, out_dir: str) -> tuple[dict[int, str], dict[int, PageVerdict]]:
+    """返回 ({页码: 可直接使用的文字}, {页码: 判定})，页码从 1 开始"""
+    texts, verdicts = {}, {}
+    with extract_text_layer(pdf_path, out_dir) as pages:
+        for i in range(1, total + 1):
+            text = pages.page(i - 1) if i - 1 < len(pages) else ""
+            verdicts[i] = judge(text)
+            if verdicts[i].usable:
+                texts[i] = text.strip()
+    return texts, verdicts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python3 scripts/pdf_text_layer.py <PDF 文件>", file=sys.stderr)
+        sys.exit(1)
+    from ocr import pdf_page_count
+    total = pdf_page_count(sys.argv[1])
+    with tempfile.TemporaryDirectory(prefix="pdf-text-") as tmp:
+        texts, verdicts = usable_pages(sys.argv[1], total, tmp)
+    for i, v in verdicts.items():
+        status = "文字层" if v.usable else f"OCR（{v.reason}）"
+        print(f"第 {i} 页: {v.chars} 字, 正常字符 {v.good_ratio:.0%} → {status}")
+    print(f"{len(texts)}/{total} 页可直接使用文字层", file=sys.stderr)
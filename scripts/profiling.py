@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-stage instrumentation shared by the ingestion and OCR scripts.
+
+Scripts mark their stages and expose a --profile flag:
+
+  from profiling import profiler
+
+  with profiler.stage('render'):
+      ...
+  @profiler.timed('toc_parse')
+  def parse_toc(...): ...
+  for page in profiler.iterate('page_split', pages, size=utf8_len):
+      ...
+  profiler.add_bytes('http_roundtrip', len(response.content))
+
+  # in main(), after argparse:
+  profiler.enable(args.profile)      # no-op when args.profile is None
+  ...
+  profiler.write()
+
+For every stage it records calls, items, bytes, inclusive wall time and
+self time (wall time minus nested stages, so a generator pipeline's
+stages add up instead of double counting). iterate() times each next()
+on the wrapped iterator, which is how the lazy page → line → paragraph
+stages get their own numbers.
+
+--profile PATH writes a Chrome trace (chrome://tracing, Perfetto) when
+PATH ends in .json, otherwise JSON lines: one header line, then one line
+per stage. A summary table always goes to stderr.
+
+While disabled, stage() returns a shared no-op context manager,
+iterate() returns its argument unchanged and a timed() wrapper only
+checks a flag, so the hooks cost next to nothing without --profile.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import functools
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict
+
+_NULL = nullcontext()
+
+
+def utf8_len(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    items: int = 0
+    bytes: int = 0
+    wall_ms: float = 0.0
+    self_ms: float = 0.0
+    rss_growth_kb: int = 0
+
+
+def _max_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class _Frame:
+    __slots__ = ('name', 'start', 'child', 'rss', 'child_rss')
+
+    def __init__(self, name: str, start: float, rss: int):
+        self.name = name
+        self.start = start
+        self.child = 0.0
+        self.rss = rss
+        self.child_rss = 0
+
+
+class _Stage:
+    """Context manager for one timed stage invocation."""
+    __slots__ = ('profiler', 'name', 'bytes', 'items', 'trace', 'frame')
+
+    def __init__(self, profiler: 'Profiler', name: str, nbytes: int, items: int, trace: bool):
+        self.profiler = profiler
+        self.name = name
+        self.bytes = nbytes
+        self.items = items
+        self.trace = trace
+
+    def __enter__(self) -> '_Stage':
+        self.frame = self.profiler._push(self.name)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler._pop(self.frame, self.bytes, self.items, self.trace)
+
+
+class Profiler:
+    """Thread-safe stage timer; one module-level instance, `profiler`."""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.path: str | None = None
+        self.stats: dict[str, StageStats] = {}
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t0 = time.perf_counter()
+
+    def enable(self, path: str | None, memory: bool = False) -> None:
+        """Start recording; write() will save to path. None leaves it off.
+
+        memory=True also attributes growth of the process's peak RSS to the
+        stage that was running (self, like self_ms) at the cost of a
+        getrusage() per call; bench.py uses it for per-stage peak memory.
+        """
+        if path is None:
+            return
+        self.enabled = True
+        self.memory = memory
+        self.path = path
+        self.stats.clear()
+        self.events.clear()
+        self._t0 = time.perf_counter()
+
+    def _stack(self) -> list[_Frame]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, name: str) -> _Frame:
+        frame = _Frame(name, time.perf_counter(), _max_rss_kb() if self.memory else 0)
+        self._stack().append(frame)
+        return frame
+
+    def _pop(self, frame: _Frame, nbytes: int, items: int, trace: bool) -> None:
+        end = time.perf_counter()
+        stack = self._stack()
+        stack.pop()
+        wall = end - frame.start
+        growth = _max_rss_kb() - frame.rss if self.memory else 0
+        if stack:
+            stack[-1].child += wall
+            stack[-1].child_rss += growth
+        with self._lock:
+            s = self.stats.get(frame.name)
+            if s is None:
+                s = self.stats[frame.name] = StageStats()
+            s.calls += 1
+            s.items += items
+            s.bytes += nbytes
+            s.wall_ms += wall * 1000
+            s.self_ms += (wall - frame.child) * 1000
+            s.rss_growth_kb += growth - frame.child_rss
+            if trace:
+                self.events.append({
+                    'name': frame.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': round((frame.start - self._t0) * 1e6, 1), 'dur': round(wall * 1e6, 1),
+                    'args': {'bytes': nbytes} if nbytes else {},
+                })
+
+    def stage(self, name: str, bytes: int = 0, items: int = 0):
+        """Time a block as one call of stage `name`."""
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name, bytes, items, True)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator: every call of the function is one call of stage `name`."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name, 0, 0, True):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def add_bytes(self, name: str, nbytes: int) -> None:
+        """Attribute bytes to a stage when the size is only known afterwards."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stats.setdefault(name, StageStats()).bytes += nbytes
+
+    def iterate(self, name: str, iterable: Iterable, size: Callable[[object], int] | None = None) -> Iterator:
+        """Wrap an iterator so each next() counts as a call of stage `name`.
+
+        Individual pulls are not written to the Chrome trace (there can be
+        millions); a single span covering the whole iteration is.
+        """
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iter(iterable), size)
+
+    def _iterate(self, name: str, it: Iterator, size) -> Iterator:
+        first = time.perf_counter()
+        try:
+            while True:
+                frame = self._push(name)
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self._pop(frame, 0, 0, False)
+                    return
+                except BaseException:
+                    self._pop(frame, 0, 0, False)
+                    raise
+                self._pop(frame, size(item) if size else 0, 1, False)
+                yield item
+        finally:
+            with self._lock:
+                self.events.append({
+                    'name': f'{name} (iteration)', 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': round((first - self._t0) * 1e6, 1),
+                    'dur': round((time.perf_counter() - first) * 1e6, 1),
+                })
+
+    def summary(self) -> dict:
+        return {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in asdict(s).items()}
+                for name, s in sorted(self.stats.items(), key=lambda kv: -kv[1].self_ms)}
+
+    def write(self) -> None:
+        """Save the profile to the --profile path and print a summary to stderr."""
+        if not self.enabled:
+            return
+        total_ms = (time.perf_counter() - self._t0) * 1000
+        stats = self.summary()
+        header = {'script': os.path.basename(sys.argv[0]), 'argv': sys.argv[1:],
+                  'pid': os.getpid(), 'total_ms': round(total_ms, 3)}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            if self.path.endswith('.json'):
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms',
+                           'otherData': {**header, 'stages': stats}}, f, ensure_ascii=False)
+            else:
+                f.write(json.dumps(header, ensure_ascii=False) + '\n')
+                for name, s in stats.items():
+                    f.write(json.dumps({'stage': name, **s}, ensure_ascii=False) + '\n')
+        print(f'profile: {self.path} ({total_ms:.1f} ms total)', file=sys.stderr)
+        width = max([5, *map(len, stats)])
+        print(f"  {'stage'.ljust(width)}  {'calls':>8}  {'items':>8}  {'bytes':>12}  {'wall_ms':>10}  {'self_ms':>10}",
+              file=sys.stderr)
+        for name, s in stats.items():
+            print(f"  {name.ljust(width)}  {s['calls']:>8}  {s['items']:>8}  {s['bytes']:>12}  "
+                  f"{s['wall_ms']:>10.2f}  {s['self_ms']:>10.2f}", file=sys.stderr)
+
+
+profiler = Profiler()
+
+
+def add_profile_argument(parser) -> None:
+    parser.add_argument("--profile", metavar="PATH",
+                        help="record per-stage timings: Chrome trace if PATH ends in .json, else JSON lines")
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Clean pdftotext-style thesis dumps (books/*/full_text.txt) into Markdown.
+
+The input has one page per form feed. Each page ends with an optional
+footnote block (lines starting with ①②③… or the OCR'd 'c'/'d' markers)
+followed by a bare page number. Body lines carry the matching marker at
+their end, which is rewritten to a Markdown footnote reference.
+
+Everything is a forward-only generator pipeline:
+
+  pages → body lines → merged paragraphs → MarkdownWriter
+
+with at most one line of lookahead, so memory stays flat however long
+the thesis is. Footnotes are spooled to a temp file until the body is
+written. Pages can come from any iterable (iter_pages) or from a
+page_index.PageIndex, which memory-maps the file and jumps straight to
+the start and 注释 pages instead of reading up to them.
+
+Usage:
+  python3 scripts/thesis_clean.py books/essay4_zhangqiuge/full_text.txt \\
+      --start '“边塞”一词从词源上看很早就出现了' -o /tmp/thesis.md
+
+clean_zhangqiuge.py is the per-thesis wrapper that adds front matter.
+"""
+
+import re
+import sys
+import json
+import argparse
+import tempfile
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, asdict
+from typing import TextIO
+
+from page_index import PageIndex
+from profiling import profiler, utf8_len, add_profile_argument
+
+FOOTNOTE_MARKERS = '①②③④⑤⑥⑦⑧⑨⑩cd'
+INLINE_MARKERS = ('c', 'd', '①', '②', '③', '④')
+FOOTER_WINDOW = 15
+SPLIT_HEADINGS = ('结语',)
+END_HEADING = '注释'
+CITATION_STOP = ('参考文献', '在读期间发表论文清单', '致谢', '致 谢', '学位论文独创性声明', '学位论文知识产权权属声明')
+TERMINAL_PUNCTUATION = ('。', '！', '？', '”', '；', '：', '"', '）')
+READ_CHUNK = 1 << 16
+
+PAGE_NUMBER_RE = re.compile(r'^\d+$')
+FOOTNOTE_RE = re.compile(rf'^([{FOOTNOTE_MARKERS}])\s*(.*)', re.DOTALL)
+CHAPTER_RE = re.compile(r'^([一二三四五六七八九十]+)\s+(.+)$')
+SECTION_RE = re.compile(r'^（([一二三四五六七八九十]+)）\s*(.+)$')
+NUMERAL_RE = re.compile(r'^([一二三四五六七八九十]+)$')
+CITATION_REF_RE = re.compile(r'^\[\d+\]$')
+CITATION_START_RE = re.compile(r'^\[\d+\]')
+TRAILING_NOTE_RE = re.compile(r'\[\^f\d+\]$')
+TRAILING_CITE_RE = re.compile(r'\[\d+\]$')
+CONTINUATION_RE = re.compile(r'^([””）\]]|\[\d+\]|[，。、？！：；,\.])')
+
+
+@dataclass
+class Footnote:
+    id: str
+    original: str
+    text: str
+
+
+class FootnoteSpool:
+    """Append-only footnote store backed by a temp file (one JSON per line)."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.count = 0
+
+    def append(self, fn: Footnote) -> None:
+        self._file.write(json.dumps(asdict(fn), ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Footnote]:
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            yield Footnote(**json.loads(line))
+        self._file.seek(0, 2)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def iter_pages(f: TextIO, chunk_size: int = READ_CHUNK) -> Iterator[str]:
+    """Yield form-feed separated pages, reading the file in chunks."""
+    buf = ''
+    for chunk in iter(lambda: f.read(chunk_size), ''):
+        buf += chunk
+        *pages, buf = buf.split('\f')
+        yield from pages
+    yield buf
+
+
+def is_end_page(page: str, end_heading: str = END_HEADING) -> bool:
+    return f'\n{end_heading}\n' in page or page.strip().startswith(end_heading)
+
+
+class ThesisPages:
+    """Forward-only split of a page stream into body pages and notes pages.
+
+    body() skips to the first page containing start_marker and stops at
+    the page headed end_heading; notes() continues from that page.
+
+    Given a PageIndex instead of a plain iterable, both boundary pages are
+    found by searching the mapped bytes, and only the pages from the start
+    page onwards are ever decoded.
+    """
+
+    def __init__(self, pages: Iterable[str] | PageIndex, start_marker: str, end_heading: str = END_HEADING):
+        self._index = pages if isinstance(pages, PageIndex) else None
+        self._pages = iter(pages) if self._index is None else iter(())
+        self.start_marker = start_marker
+        self.end_heading = end_heading
+        self._notes_head: str | None = None
+
+    def body(self) -> Iterator[str]:
+        if self._index is not None:
+            yield from self._indexed_body()
+            return
+        for page in self._pages:
+            if self.start_marker in page:
+                break
+        else:
+            raise ValueError(f'start marker not found: {self.start_marker!r}')
+        while page is not None:
+            if is_end_page(page, self.end_heading):
+                self._notes_head = page
+                return
+            yield page
+            page = next(self._pages, None)
+
+    def _indexed_body(self) -> Iterator[str]:
+        index = self._index
+        start = index.find(self.start_marker)
+        if start is None:
+            raise ValueError(f'start marker not found: {self.start_marker!r}')
+        end = index.find_heading(self.end_heading, start)
+        if end is None:
+            end = len(index)
+        self._pages = index.iter_pages(end)
+        yield from index.iter_pages(start, end)
+
+    def notes(self) -> Iterator[str]:
+        if self._notes_head is not None:
+            yield self._notes_head
+            self._notes_head = None
+        yield from self._pages
+
+
+class PageCleaner:
+    """Strip page numbers and footnote blocks page by page.
+
+    iter_lines() turns a page stream into cleaned body lines. Footnotes
+    go to .footnotes (a list, or a FootnoteSpool); numbering and the
+    "last footnote" used to resolve inline markers carry across pages.
+    """
+
+    def __init__(self, footnotes=None, id_format: str = '[^f{n}]'):
+        self.id_format = id_format
+        self.footnotes = footnotes if footnotes is not None else []
+        self._last: Footnote | None = None
+        self._count = 0
+
+    def page_body(self, page: str) -> list[str]:
+        """Record the page's footnote, if any, and return its stripped body lines."""
+        lines = page.split('\n')
+        stripped = []
+        last_nonblank = -1
+        markers = []
+        # Single pass: strip each line once and note where footnote markers
+        # and the last non-blank line (the page number candidate) are.
+        for i, line in enumerate(lines):
+            s = line.strip()
+            stripped.append(s)
+            if s:
+                last_nonblank = i
+                if s[0] in FOOTNOTE_MARKERS:
+                    markers.append(i)
+
+        page_num_idx = -1
+        if last_nonblank != -1 and PAGE_NUMBER_RE.match(stripped[last_nonblank]):
+            page_num_idx = last_nonblank
+        footer_end = page_num_idx if page_num_idx != -1 else len(lines)
+        window_start = max(0, footer_end - FOOTER_WINDOW)
+        footnote_start = next((i for i in markers if window_start <= i < footer_end), -1)
+
+        if footnote_start != -1:
+            text = '\n'.join(s for s in stripped[footnote_start:footer_end] if s)
+            m = FOOTNOTE_RE.match(text)
+            self._count += 1
+            self._last = Footnote(id=self.id_format.format(n=self._count), original=m.group(1), text=m.group(2))
+            self.footnotes.append(self._last)
+            return stripped[:footnote_start]
+        if page_num_idx != -1:
+            return stripped[:page_num_idx]
+        return stripped
+
+    def _ref(self, marker: str) -> str:
+        if self._last is not None and self._last.original == marker:
+            return self._last.id
+        return ''
+
+    def iter_lines(self, pages: Iterable[str]) -> Iterator[str]:
+        """Yield cleaned body lines.
+
+        Two lines are held back: a bare marker line appends its reference
+        to the previous line, and a heading split over two lines (结 / 语)
+        is rejoined once both halves are final.
+        """
+        held: list[str] = []
+        for body in profiler.iterate('footnote_extraction', map(self.page_body, pages)):
+            for s in body:
+                if s in INLINE_MARKERS:
+                    ref = self._ref(s)
+                    if ref and held:
+                        held[-1] += ref
+                    continue
+                if s.endswith('c') and not s.endswith('ac') and len(s) > 5:
+                    s = s[:-1] + self._ref('c')
+                elif s.endswith('d') and not s.endswith('and') and len(s) > 5:
+                    s = s[:-1] + self._ref('d')
+                elif s[-1:] in INLINE_MARKERS[2:]:
+                    s = s[:-1] + self._ref(s[-1:])
+                if not s:
+                    continue
+                if len(held) == 2:
+                    yield from _release_held(held)
+                held.append(s)
+        if len(held) == 2:
+            yield from _release_held(held)
+        yield from held
+
+
+def _release_held(held: list[str]) -> Iterator[str]:
+    """Emit the older of two held lines, rejoining a split heading."""
+    a, b = held
+    if len(a) == 1 and a + b in SPLIT_HEADINGS:
+        held.clear()
+        yield a + b
+    else:
+        held[:] = [b]
+        yield a
+
+
+def _heading(line: str) -> str | None:
+    if len(line) < 40:
+        if CHAPTER_RE.match(line):
+            return f'## {line}'
+        if SECTION_RE.match(line):
+            return f'### {line}'
+    if line in ('前言', '结语', '结 语'):
+        return f'## {line.replace(" ", "")}'
+    return None
+
+
+def iter_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    """Merge hard-wrapped lines into paragraphs and Markdown headings.
+
+    Uses one line of lookahead: a bare numeral heading absorbs the next
+    line as its title, and a short line ending in terminal punctuation
+    only closes the paragraph if the next line is not a continuation.
+    """
+    it = iter(lines)
+    current_para: list[str] = []
+    line = next(it, None)
+
+    while line is not None:
+        nxt = next(it, None)
+        heading = _heading(line)
+
+        if heading:
+            if current_para:
+                yield ''.join(current_para)
+                current_para = []
+            yield heading
+
+        elif NUMERAL_RE.match(line):
+            if current_para:
+                yield ''.join(current_para)
+                current_para = []
+            if nxt is not None and len(nxt) < 40:
+                yield f'## {line} {nxt}'
+                nxt = ''
+
+        elif line == '':
+            pass
+
+        elif CITATION_REF_RE.match(line):
+            if current_para:
+                current_para[-1] = current_para[-1] + line
+            else:
+                current_para.append(line)
+
+        else:
+            current_para.append(line)
+            stripped_line = TRAILING_CITE_RE.sub('', TRAILING_NOTE_RE.sub('', line))
+            is_break = stripped_line.endswith(TERMINAL_PUNCTUATION) and len(stripped_line) < 35
+            if is_break and nxt is not None and CONTINUATION_RE.match(nxt.strip()):
+                is_break = False
+            if is_break:
+                yield ''.join(current_para)
+                current_para = []
+
+        line = nxt
+
+    if current_para:
+        yield ''.join(current_para)
+
+
+def iter_citations(pages: Iterable[str]) -> Iterator[str]:
+    """Yield the numbered [n] citations from the notes pages."""
+    curr_cit: list[str] = []
+    for p in pages:
+        for line in p.split('\n'):
+            line = line.strip()
+            if not line or PAGE_NUMBER_RE.match(line):
+                continue
+            if line in CITATION_STOP:
+                if curr_cit:
+                    yield ' '.join(curr_cit)
+                return
+            if CITATION_START_RE.match(line):
+                if curr_cit:
+                    yield ' '.join(curr_cit)
+                curr_cit = [line]
+            elif curr_cit:
+                curr_cit.append(line)
+    if curr_cit:
+        yield ' '.join(curr_cit)
+
+
+class MarkdownWriter:
+    """Write Markdown lines to a file as they are produced ('\\n'-joined)."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.lines = 0
+
+    def line(self, text: str = '') -> None:
+        if self.lines:
+            self.f.write('\n')
+        self.f.write(text)
+        self.lines += 1
+
+    def block(self, text: str) -> None:
+        self.line(text)
+        self.line()
+
+
+@dataclass
+class ThesisStats:
+    paragraphs: int = 0
+    footnotes: int = 0
+    citations: int = 0
+
+
+def write_thesis(out: MarkdownWriter, pages: Iterable[str] | PageIndex, start_marker: str) -> ThesisStats:
+    """Stream the body, footnote and citation sections of a thesis to out."""
+    stats = ThesisStats()
+    sections = ThesisPages(pages, start_marker)
+    spool = FootnoteSpool()
+    try:
+        cleaner = PageCleaner(footnotes=spool)
+        body = profiler.iterate('page_split', sections.body(), size=utf8_len)
+        lines = profiler.iterate('body_lines', cleaner.iter_lines(body))
+        paragraphs = profiler.iterate('merge', iter_paragraphs(lines), size=utf8_len)
+
+        # The 前言 heading is only added if none of the first five
+        # paragraphs carries it, so those are buffered before writing.
+        head = [p for _, p in zip(range(5), paragraphs)]
+        if not any('前言' in p for p in head):
+            out.block('## 前言')
+        for p in head:
+            out.block(p)
+            stats.paragraphs += 1
+        for p in paragraphs:
+            out.block(p)
+            stats.paragraphs += 1
+
+        if len(spool):
+            out.line('---')
+            out.block('## 脚注')
+            for fn in spool:
+                text = fn.text.replace('\n', ' ')
+                out.block(f'{fn.id}: {text}')
+            stats.footnotes = len(spool)
+    finally:
+        spool.close()
+
+    notes = profiler.iterate('page_split', sections.notes(), size=utf8_len)
+    for c in profiler.iterate('citations', iter_citations(notes)):
+        if not stats.citations:
+            out.line('---')
+            out.block('## 注释 (引文)')
+        out.block(c)
+        stats.citations += 1
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a form-feed thesis dump into Markdown")
+    parser.add_argument("file", help="full_text.txt with \\f page breaks")
+    parser.add_argument("--start", required=True, help="phrase that appears on the first body page")
+    parser.add_argument("--output", "-o", help="output Markdown path (default stdout)")
+    parser.add_argument("--page-index", help="sidecar file for the page offsets, reused while the input is unchanged")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    profiler.enable(args.profile)
+
+    with profiler.stage('page_index'):
+        pages = PageIndex(args.file, sidecar=args.page_index)
+    with pages:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                stats = write_thesis(MarkdownWriter(out), pages, args.start)
+            print(f"Generated {args.output}: {stats.paragraphs} paragraphs, {stats.footnotes} footnotes, "
+                  f"{stats.citations} citations.", file=sys.stderr)
+        else:
+            write_thesis(MarkdownWriter(sys.stdout), pages, args.start)
+            print()
+    profiler.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Paragraph text store and fuzzy TOC-title matching for docx book imports.
+
+ParagraphStore keeps the stripped and normalized text of every paragraph,
+each computed exactly once and packed into a single string with an
+array of offsets, so the matcher and the body-slicing code read the same
+precomputed texts instead of re-stripping / re-normalizing on every
+comparison.
+"""
+
+import re
+import difflib
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+
+from profiling import profiler
+
+MATCH_THRESHOLD = 0.8
+NORMALIZE_RE = re.compile(r'[，。！？；：“”‘’「」\s]+')
+
+
+def normalize(t):
+    t = t.replace('罌', '罂').replace('的', '').replace('了', '').replace('之', '')
+    return NORMALIZE_RE.sub('', t)
+
+
+def first_line(title):
+    return title.split('／')[0].strip() if '／' in title else title.strip()
+
+
+def match_score(s1, s2):
+    s1n, s2n = normalize(s1), normalize(s2)
+    if not s1n or not s2n: return 0.0
+    if s1n == s2n: return 1.0
+    if (s1n in s2n or s2n in s1n) and min(len(s1n), len(s2n)) >= 6: return 0.9
+    return difflib.SequenceMatcher(None, s1n, s2n).ratio()
+
+
+class _PackedStrings:
+    """Immutable list of strings stored as one str plus an offsets array."""
+
+    def __init__(self, items: Iterable[str]):
+        parts = []
+        offsets = array('I', [0])
+        end = 0
+        for s in items:
+            parts.append(s)
+            end += len(s)
+            offsets.append(end)
+        self._blob = ''.join(parts)
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+    def length(self, i):
+        return self._offsets[i + 1] - self._offsets[i]
+
+
+class ParagraphStore:
+    """Stripped and normalized paragraph texts, computed once per paragraph.
+
+    first_match() returns exactly what scanning with
+    match_score() >= MATCH_THRESHOLD and taking the first hit would.
+    """
+
+    def __init__(self, texts: Iterable[str]):
+        stripped = [t.strip() for t in texts]
+        self.texts = _PackedStrings(stripped)
+        self.norms = _PackedStrings(normalize(t) for t in stripped)
+        self._counts = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def text(self, i):
+        return self.texts[i]
+
+    def norm(self, i):
+        return self.norms[i]
+
+    def _char_counts(self, i):
+        c = self._counts.get(i)
+        if c is None:
+            c = self._counts[i] = Counter(self.norms[i])
+        return c
+
+    @profiler.timed('fuzzy_match')
+    def first_match(self, title, start, end, threshold=MATCH_THRESHOLD):
+        t = normalize(title)
+        if not t: return None
+        tl = len(t)
+        t_counts = None
+        for i in range(start, end):
+            pl = self.norms.length(i)
+            if not pl: continue
+            total = tl + pl
+            # Upper bound on SequenceMatcher.ratio() from lengths alone
+            # (real_quick_ratio); containment can still score 0.9, so only
+            # skip here when the shorter side is too short for that too.
+            if 2.0 * min(tl, pl) / total < threshold and min(tl, pl) < 6: continue
+            p = self.norms[i]
+            if p == t: return i
+            if min(tl, pl) >= 6 and (t in p or p in t): return i
+            if 2.0 * min(tl, pl) / total < threshold: continue
+            # Shared character multiset (quick_ratio, a unigram filter).
+            if t_counts is None: t_counts = Counter(t)
+            if 2.0 * sum((t_counts & self._char_counts(i)).values()) / total < threshold: continue
+            if difflib.SequenceMatcher(None, t, p).ratio() >= threshold: return i
+        return None
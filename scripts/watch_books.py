@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Watch books/ and re-run only the build step that owns a changed file.
+
+  books/<slug>/import.json, *.docx  →  import + essays
+  books/<slug>/source.md            →  essays
+  books/<slug>/full_text.txt        →  thesis (only with --steps …,thesis)
+
+Changes are picked up with inotify on Linux (through libc, no extra
+packages) and by polling file mtimes everywhere else. A burst of saves
+is debounced into one rebuild: the step runs once the tree has been
+quiet for --debounce seconds, or at the latest after --max-wait.
+
+Everything runs in this one process, so state stays warm between runs:
+the modules are imported once, the essay manifest stays in memory, and
+parsed docx paragraph stores are kept until their file changes, so
+editing import.json re-renders without re-reading the docx.
+
+Usage (from anywhere; Ctrl-C to stop):
+  python3 scripts/watch_books.py
+  python3 scripts/watch_books.py --poll 0.5 --steps import,essays,thesis
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+
+import build_books
+import extract_missing_essays as essays
+
+DEBOUNCE = 0.15
+MAX_WAIT = 0.8
+POLL_INTERVAL = 0.5
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp', '.part')
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct('iIII')
+
+
+def steps_for(path):
+    """(book, steps) that own a path under books/, or None."""
+    parts = path.split(os.sep)
+    if len(parts) != 3 or parts[0] != build_books.BOOKS_DIR:
+        return None
+    _, book, name = parts
+    if name.startswith('.') or name.startswith('~$') or name.endswith(IGNORED_SUFFIXES):
+        return None
+    if name == build_books.docx_book.CONFIG_NAME or name.endswith('.docx'):
+        return book, ('import', 'essays')
+    if name == 'source.md':
+        return book, ('essays',)
+    if name == 'full_text.txt':
+        return book, ('thesis',)
+    return None
+
+
+class InotifyWatcher:
+    """Recursive inotify watch on a directory tree via libc."""
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs = {}
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            self._add(dirpath)
+
+    def _add(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed: {path}')
+        self._dirs[wd] = path
+
+    def wait(self, timeout):
+        """Changed paths seen within timeout seconds (may be empty)."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+            off = 0
+            while off < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, off)
+                name = data[off + _EVENT.size:off + _EVENT.size + length].rstrip(b'\0')
+                off += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    print('  inotify queue overflowed; some changes may be missed', file=sys.stderr)
+                    continue
+                path = os.path.join(self._dirs.get(wd, ''), os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add(path)
+                    continue
+                # IN_CREATE alone is an empty file; its content arrives with IN_CLOSE_WRITE.
+                if mask & ~IN_CREATE:
+                    changed.add(path)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback: compare (size, mtime) snapshots of the tree."""
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        old, self._snapshot = self._snapshot, snapshot
+        return {p for p in old.keys() | snapshot.keys() if old.get(p) != snapshot.get(p)}
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, poll=None):
+    if poll is None:
+        try:
+            return InotifyWatcher(root), 'inotify'
+        except OSError as e:
+            print(f"inotify unavailable ({e}), polling instead", file=sys.stderr)
+            poll = POLL_INTERVAL
+    return PollingWatcher(root, poll), f'polling every {poll}s'
+
+
+def collect(watcher, debounce, max_wait):
+    """Block until something changes, then keep collecting until the tree
+    has been quiet for debounce seconds (or max_wait has passed)."""
+    changed = set()
+    while not changed:
+        changed = watcher.wait(3600)
+    first = last = time.monotonic()
+    while True:
+        now = time.monotonic()
+        remaining = min(last + debounce, first + max_wait) - now
+        if remaining <= 0:
+            return changed
+        more = watcher.wait(remaining)
+        if more:
+            changed |= more
+            last = time.monotonic()
+
+
+def rebuild(changed, enabled, manifest, docx_cache):
+    plan = {}
+    for path in sorted(changed):
+        owner = steps_for(os.path.relpath(path))
+        if owner:
+            book, steps = owner
+            plan.setdefault(book, set()).update(s for s in steps if s in enabled)
+    for book, steps in sorted(plan.items()):
+        if not steps:
+            continue
+        start = time.perf_counter()
+        r = build_books.build_book(book, steps, manifest, docx_cache=docx_cache)
+        status = f"FAILED: {r.error}" if r.error else ", ".join(r.steps) or "nothing to do"
+        print(f"[{time.strftime('%H:%M:%S')}] {book}: {status} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        for line in r.log.splitlines():
+            print(f"    {line}")
+    return bool(plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild books as their source files change")
+    parser.add_argument("--steps", default=",".join(build_books.DEFAULT_STEPS),
+                        help=f"steps to run on change (default: {','.join(build_books.DEFAULT_STEPS)})")
+    parser.add_argument("--poll", type=float, metavar="SECONDS", help="poll instead of using inotify")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE, help=f"quiet period before rebuilding (default {DEBOUNCE}s)")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT, help=f"rebuild after this long even if saves continue (default {MAX_WAIT}s)")
+    args = parser.parse_args()
+
+    enabled = {s for s in args.steps.split(",") if s}
+    unknown = enabled - set(build_books.ALL_STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    os.chdir(build_books.ROOT)
+    watcher, how = make_watcher(build_books.BOOKS_DIR, args.poll)
+    manifest = essays.load_manifest()
+    docx_cache = {}
+    print(f"Watching {build_books.BOOKS_DIR}/ ({how}); steps: {', '.join(sorted(enabled))}. Ctrl-C to stop.", file=sys.stderr)
+    saved = json.dumps(manifest, sort_keys=True)
+    try:
+        while True:
+            changed = collect(watcher, args.debounce, args.max_wait)
+            if rebuild(changed, enabled, manifest, docx_cache):
+                current = json.dumps(manifest, sort_keys=True)
+                if current != saved:
+                    essays.save_manifest(manifest)
+                    saved = current
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()